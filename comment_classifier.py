@@ -8,7 +8,7 @@
 import os
 import json
 import argparse
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Callable
 from dotenv import load_dotenv
 import requests
 import time
@@ -261,40 +261,59 @@ class CommentClassifier:
             print("数据为空")
             return
         
-        # 多线程处理
+        classifier_results = self.classify_items(filtered_data, max_chars=max_chars, num_threads=num_threads)
+        
+        # 保存分类结果
+        print(f"\n保存分类结果...")
+        self.save_classifier_output(task_id, classifier_results)
+        
+        print(f"\n任务 {task_id} 分类完成！")
+    
+    def classify_items(self, items: Iterable[Dict[str, Any]], max_chars: Optional[int] = None,
+                       num_threads: int = 16,
+                       on_result: Optional[Callable[[Dict[str, Any], Optional[Dict[str, Any]]], None]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        并行分类一级评论项目
+        items可以是生成器：每取到一个项目就立即提交API请求，不必等上游全部完成
+        
+        Args:
+            items: 一级评论项目（列表或生成器）
+            max_chars: 最大字符数限制
+            num_threads: 并发线程数
+            on_result: 每个项目分类完成后的回调 (item, result)，失败时result为None
+            
+        Returns:
+            分类结果字典 {comment_id: result}
+        """
         print(f"\n使用 {num_threads} 个线程并行分类...")
         classifier_results = {}
         success_count = 0
         fail_count = 0
         
-        def process_single_comment(item: Dict[str, Any]) -> tuple[str, Optional[Dict[str, Any]]]:
-            """处理单个一级评论"""
-            comment_id = item.get('source_platform_id', '')
-            result = self.process_comment(item, max_chars=max_chars)
-            return comment_id, result
-        
         with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            future_to_item = {
-                executor.submit(process_single_comment, item): item
-                for item in filtered_data
-            }
+            # 边读取边提交，上游（如过滤）与API请求重叠执行
+            future_to_item = {}
+            for item in items:
+                future_to_item[executor.submit(self.process_comment, item, max_chars)] = item
+            total = len(future_to_item)
             
             completed_count = 0
             for future in as_completed(future_to_item):
                 item = future_to_item[future]
                 comment_id = item.get('source_platform_id', '')
                 title = item.get('title', '')[:50]
+                result = None
                 
                 try:
-                    result_comment_id, result = future.result()
+                    result = future.result()
                     completed_count += 1
                     
                     with self.print_lock:
-                        print(f"[{completed_count}/{len(filtered_data)}] Comment: {comment_id}")
+                        print(f"[{completed_count}/{total}] Comment: {comment_id}")
                         print(f"  标题: {title}...")
                     
                     if result:
-                        classifier_results[result_comment_id] = result
+                        classifier_results[comment_id] = result
                         success_count += 1
                         with self.print_lock:
                             print(f"  结果: 成功 - scene={result.get('scene')}, type={result.get('post_type')}, score={result.get('base_quality_score')}")
@@ -307,18 +326,17 @@ class CommentClassifier:
                     completed_count += 1
                     fail_count += 1
                     with self.print_lock:
-                        print(f"[{completed_count}/{len(filtered_data)}] Comment: {comment_id}")
+                        print(f"[{completed_count}/{total}] Comment: {comment_id}")
                         print(f"  错误: {e}")
+                
+                if on_result:
+                    on_result(item, result)
         
         print(f"\n分类完成:")
         print(f"  - 成功: {success_count} 条")
         print(f"  - 失败: {fail_count} 条")
         
-        # 保存分类结果
-        print(f"\n保存分类结果...")
-        self.save_classifier_output(task_id, classifier_results)
-        
-        print(f"\n任务 {task_id} 分类完成！")
+        return classifier_results
     
     def save_classifier_output(self, task_id: str, classifier_results: Dict[str, Dict[str, Any]]):
         """
@@ -8,7 +8,7 @@
 import os
 import json
 import argparse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 
 class CommentFilter:
@@ -145,6 +145,19 @@ class CommentFilter:
         Returns:
             过滤后的数据列表
         """
+        return list(self.iter_filter_task(task_id, max_second_level=max_second_level))
+    
+    def iter_filter_task(self, task_id: str, max_second_level: int = 5) -> Iterator[Dict[str, Any]]:
+        """
+        逐个过滤任务的评论项目（生成器版本，供管线边过滤边分类）
+        
+        Args:
+            task_id: 任务ID
+            max_second_level: 最多保留的二级评论数
+            
+        Yields:
+            过滤后的评论项目
+        """
         print(f"\n开始过滤评论: {task_id}")
         print("=" * 80)
         
@@ -154,17 +167,18 @@ class CommentFilter:
             print(f"✓ 加载了 {len(raw_data)} 个评论项目")
         except FileNotFoundError as e:
             print(f"✗ 错误: {e}")
-            return []
+            return
         
         if not raw_data:
             print("数据为空")
-            return []
+            return
         
         # 过滤每个评论项目
-        filtered_data = []
+        total_count = 0
         filtered_count = 0
         
         for i, item in enumerate(raw_data, 1):
+            total_count += 1
             # 获取原始二级评论数
             comments_tree = item.get('comments_tree', [])
             if comments_tree:
@@ -173,7 +187,6 @@ class CommentFilter:
                 
                 # 过滤
                 filtered_item = self.filter_comment_item(item, max_second_level)
-                filtered_data.append(filtered_item)
                 
                 # 统计过滤情况
                 filtered_first_level = filtered_item['comments_tree'][0]
@@ -182,14 +195,14 @@ class CommentFilter:
                 if original_replies_count > max_second_level:
                     filtered_count += 1
                     print(f"  项目 {i}: 二级评论 {original_replies_count} → {filtered_replies_count} (保留upvote最多的{max_second_level}个)")
+                
+                yield filtered_item
             else:
-                filtered_data.append(item)
+                yield item
         
         print(f"\n✓ 过滤完成")
-        print(f"  - 总项目数: {len(filtered_data)}")
+        print(f"  - 总项目数: {total_count}")
         print(f"  - 被过滤的项目数: {filtered_count}")
-        
-        return filtered_data
     
     def save_filtered_data(self, task_id: str, filtered_data: List[Dict[str, Any]]):
         """
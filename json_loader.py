@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON文件读取工具
+功能：merge_tasks.py、prepare_for_db.py、view_ready_data.py 共用的JSON文件读取函数
+"""
+
+import os
+import json
+import mmap
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json_file(filepath: str) -> Any:
+    """
+    读取JSON文件
+    安装了orjson时通过mmap直接解析页缓存中的文件内容，避免先整体读入再解码的额外拷贝
+
+    Args:
+        filepath: 文件路径
+
+    Returns:
+        解析后的数据
+    """
+    if orjson is None:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"文件为空: {filepath}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
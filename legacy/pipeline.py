@@ -122,24 +122,14 @@ class Pipeline:
             if not data:
                 raise ValueError("未找到匹配的帖子")
             
-            # 保存数据
-            crawler.save_to_json(data, self.task_id)
+            # 保存数据（统计信息由save_to_json构建项目时一并得到，无需再遍历评论树）
+            _, total_comments = crawler.save_to_json(data, self.task_id)
             
             # 标记文件已创建
             raw_file = os.path.join(self.raw_dir, f"{self.task_id}.json")
             self._mark_file_created(raw_file)
             
             # 统计信息
-            def count_comments(comments_tree):
-                if not comments_tree:
-                    return 0
-                count = len(comments_tree)
-                for comment in comments_tree:
-                    if isinstance(comment, dict) and 'replies' in comment:
-                        count += count_comments(comment.get('replies', []))
-                return count
-            
-            total_comments = sum(count_comments(post.get('comments_tree', [])) for post in data)
             print(f"\n统计信息:")
             print(f"  - 帖子数: {len(data)}")
             print(f"  - 总评论数: {total_comments}")
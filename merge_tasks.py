@@ -6,10 +6,16 @@
 """
 
 import os
+import sys
 import json
 import argparse
 from typing import List, Dict, Any
 from glob import glob
+from json_loader import load_json_file
+
+
+# 值需要驻留的字段：只有这些分类字段的值会在大量记录间重复；ID、时间、作者、URL等几乎各不相同，驻留只会让驻留表无谓增长
+_INTERN_VALUE_KEYS = frozenset(('platform', 'lang', 'scene', 'sub_scene', 'post_type', 'content_type', 'query_seed'))
 
 
 class TaskMerger:
@@ -30,22 +36,35 @@ class TaskMerger:
         """
         tasks = set()
         
-        # 从posts目录查找
-        if os.path.exists(self.posts_dir):
-            for filename in os.listdir(self.posts_dir):
-                if filename.endswith('_posts.json'):
-                    task_id = filename.replace('_posts.json', '')
-                    tasks.add(task_id)
-        
-        # 从comments目录查找
-        if os.path.exists(self.comments_dir):
-            for filename in os.listdir(self.comments_dir):
-                if filename.endswith('_comments.json'):
-                    task_id = filename.replace('_comments.json', '')
-                    tasks.add(task_id)
+        # 从posts目录和comments目录查找（scandir批量读取目录项，后缀按长度直接切掉）
+        for directory, suffix in ((self.posts_dir, '_posts.json'), (self.comments_dir, '_comments.json')):
+            suffix_len = len(suffix)
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        if len(name) > suffix_len and name.endswith(suffix):
+                            tasks.add(name[:-suffix_len])
+            except FileNotFoundError:
+                continue
         
         return sorted(list(tasks))
     
+    def _task_filepath(self, directory: str, task_id: str, kind: str, ext: str = 'json') -> str:
+        """
+        构建task数据文件路径（加载和保存共用，保证同一task得到相同的路径字符串）
+        
+        Args:
+            directory: 所在目录
+            task_id: 任务ID
+            kind: posts 或 comments
+            ext: 扩展名
+            
+        Returns:
+            文件路径
+        """
+        return os.path.join(directory, f"{task_id}_{kind}.{ext}")
+    
     def load_posts(self, task_id: str) -> List[Dict[str, Any]]:
         """
         加载指定task的posts数据
@@ -56,18 +75,16 @@ class TaskMerger:
         Returns:
             posts数据列表
         """
-        filename = f"{task_id}_posts.json"
-        filepath = os.path.join(self.posts_dir, filename)
+        filepath = self._task_filepath(self.posts_dir, task_id, 'posts')
         
         if not os.path.exists(filepath):
             print(f"  ⚠️  Posts文件不存在: {filepath}")
             return []
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                print(f"  ✓ 加载了 {len(data)} 条posts")
-                return data
+            data = load_json_file(filepath)
+            print(f"  ✓ 加载了 {len(data)} 条posts")
+            return data
         except Exception as e:
             print(f"  ✗ 加载失败: {e}")
             return []
@@ -82,22 +99,38 @@ class TaskMerger:
         Returns:
             comments数据列表
         """
-        filename = f"{task_id}_comments.json"
-        filepath = os.path.join(self.comments_dir, filename)
+        filepath = self._task_filepath(self.comments_dir, task_id, 'comments')
         
         if not os.path.exists(filepath):
             print(f"  ⚠️  Comments文件不存在: {filepath}")
             return []
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                print(f"  ✓ 加载了 {len(data)} 条comments")
-                return data
+            data = load_json_file(filepath)
+            print(f"  ✓ 加载了 {len(data)} 条comments")
+            return data
         except Exception as e:
             print(f"  ✗ 加载失败: {e}")
             return []
     
+    @staticmethod
+    def _intern_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        驻留记录的字段名和分类字段的值（platform、lang、scene等，见 _INTERN_VALUE_KEYS）
+        json.load不会复用相同的字符串，合并大量记录时每条记录都持有一份独立的字段名副本
+        
+        Args:
+            record: 单条记录（已通过去重检查）
+            
+        Returns:
+            字段名/分类值已驻留的记录
+        """
+        intern = sys.intern
+        return {
+            intern(k): (intern(v) if k in _INTERN_VALUE_KEYS and isinstance(v, str) else v)
+            for k, v in record.items()
+        }
+    
     def merge_tasks(self, task_ids: List[str], output_task_id: str, 
                    skip_duplicates: bool = True) -> tuple:
         """
@@ -128,25 +161,30 @@ class TaskMerger:
             
             # 加载posts
             posts = self.load_posts(task_id)
-            for post in posts:
-                post_id = post.get('source_platform_id', '')
-                if skip_duplicates:
-                    if post_id and post_id in seen_post_ids:
-                        continue
+            if skip_duplicates:
+                for post in posts:
+                    post_id = post.get('source_platform_id')
                     if post_id:
+                        if post_id in seen_post_ids:
+                            continue
                         seen_post_ids.add(post_id)
-                all_posts.append(post)
+                    # 通过去重后才驻留，重复记录不做无用功
+                    all_posts.append(self._intern_record(post))
+            else:
+                all_posts.extend(map(self._intern_record, posts))
             
             # 加载comments
             comments = self.load_comments(task_id)
-            for comment in comments:
-                comment_id = comment.get('source_comment_id', '')
-                if skip_duplicates:
-                    if comment_id and comment_id in seen_comment_ids:
-                        continue
+            if skip_duplicates:
+                for comment in comments:
+                    comment_id = comment.get('source_comment_id')
                     if comment_id:
+                        if comment_id in seen_comment_ids:
+                            continue
                         seen_comment_ids.add(comment_id)
-                all_comments.append(comment)
+                    all_comments.append(self._intern_record(comment))
+            else:
+                all_comments.extend(map(self._intern_record, comments))
         
         print("\n" + "=" * 80)
         print(f"合并完成:")
@@ -155,9 +193,29 @@ class TaskMerger:
         
         return all_posts, all_comments
     
+    def _write_records(self, records: List[Dict[str, Any]], filepath: str, output_format: str):
+        """
+        按指定格式写出记录
+        
+        Args:
+            records: 记录列表
+            filepath: 输出文件路径
+            output_format: json（缩进，便于阅读）/ compact（紧凑JSON）/ ndjson（每行一条记录）
+        """
+        with open(filepath, 'w', encoding='utf-8') as f:
+            if output_format == 'ndjson':
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n')
+            elif output_format == 'json':
+                json.dump(records, f, ensure_ascii=False, indent=2)
+            else:
+                json.dump(records, f, ensure_ascii=False, separators=(',', ':'))
+    
     def save_merged_data(self, posts: List[Dict[str, Any]], 
                         comments: List[Dict[str, Any]], 
-                        output_task_id: str):
+                        output_task_id: str,
+                        output_format: str = 'compact'):
         """
         保存合并后的数据
         
@@ -165,36 +223,39 @@ class TaskMerger:
             posts: posts数据列表
             comments: comments数据列表
             output_task_id: 输出task ID
+            output_format: 输出格式（compact默认 / json缩进 / ndjson每行一条，扩展名为.ndjson）；
+                ndjson仅用于导出，merge_tasks.py 和 import_to_supabase.py 都不会读取.ndjson文件
         """
         # 确保目录存在
-        if not os.path.exists(self.posts_dir):
-            os.makedirs(self.posts_dir)
-        if not os.path.exists(self.comments_dir):
-            os.makedirs(self.comments_dir)
+        os.makedirs(self.posts_dir, exist_ok=True)
+        os.makedirs(self.comments_dir, exist_ok=True)
+        
+        ext = 'ndjson' if output_format == 'ndjson' else 'json'
+        posts_filepath = self._task_filepath(self.posts_dir, output_task_id, 'posts', ext)
+        comments_filepath = self._task_filepath(self.comments_dir, output_task_id, 'comments', ext)
         
         # 保存posts
-        posts_filename = f"{output_task_id}_posts.json"
-        posts_filepath = os.path.join(self.posts_dir, posts_filename)
-        with open(posts_filepath, 'w', encoding='utf-8') as f:
-            json.dump(posts, f, ensure_ascii=False, indent=2)
+        self._write_records(posts, posts_filepath, output_format)
         print(f"\n✓ Posts数据已保存到: {posts_filepath}")
         print(f"  共 {len(posts)} 条记录")
         
         # 保存comments
-        comments_filename = f"{output_task_id}_comments.json"
-        comments_filepath = os.path.join(self.comments_dir, comments_filename)
-        with open(comments_filepath, 'w', encoding='utf-8') as f:
-            json.dump(comments, f, ensure_ascii=False, indent=2)
+        self._write_records(comments, comments_filepath, output_format)
         print(f"✓ Comments数据已保存到: {comments_filepath}")
         print(f"  共 {len(comments)} 条记录")
+        
+        if output_format == 'ndjson':
+            print("  ⚠️  NDJSON输出仅用于导出：不能再次合并，也不能用import_to_supabase.py导入（需要时请使用默认格式重新合并）")
     
-    def merge_all_tasks(self, output_task_id: str, skip_duplicates: bool = True):
+    def merge_all_tasks(self, output_task_id: str, skip_duplicates: bool = True,
+                        output_format: str = 'compact'):
         """
         合并所有找到的task数据
         
         Args:
             output_task_id: 输出task ID
             skip_duplicates: 是否跳过重复记录
+            output_format: 输出格式（compact / json / ndjson）
         """
         # 查找所有task
         task_ids = self.find_all_tasks()
@@ -212,7 +273,7 @@ class TaskMerger:
         
         # 保存合并后的数据
         if posts or comments:
-            self.save_merged_data(posts, comments, output_task_id)
+            self.save_merged_data(posts, comments, output_task_id, output_format)
         else:
             print("\n⚠️  没有数据可保存")
 
@@ -232,6 +293,9 @@ def main():
   
   # 合并所有task，不去重
   python merge_tasks.py --output-task-id merged_task001 --no-skip-duplicates
+  
+  # 输出为NDJSON（每行一条记录，便于流式读取；仅用于导出，不能再次合并或导入Supabase）
+  python merge_tasks.py --output-task-id merged_task001 --format ndjson
         """
     )
     
@@ -243,6 +307,8 @@ def main():
                        help='跳过重复记录（默认True，基于source_platform_id和source_comment_id）')
     parser.add_argument('--no-skip-duplicates', dest='skip_duplicates', action='store_false',
                        help='不去重，保留所有记录')
+    parser.add_argument('--format', dest='output_format', choices=['compact', 'json', 'ndjson'], default='compact',
+                       help='输出格式：compact紧凑JSON（默认）、json缩进JSON、ndjson每行一条记录（仅用于导出，不能再次合并或导入Supabase）')
     
     args = parser.parse_args()
     
@@ -253,10 +319,10 @@ def main():
         print(f"合并指定的 {len(args.tasks)} 个task: {args.tasks}")
         posts, comments = merger.merge_tasks(args.tasks, args.output_task_id, args.skip_duplicates)
         if posts or comments:
-            merger.save_merged_data(posts, comments, args.output_task_id)
+            merger.save_merged_data(posts, comments, args.output_task_id, args.output_format)
     else:
         # 合并所有task
-        merger.merge_all_tasks(args.output_task_id, args.skip_duplicates)
+        merger.merge_all_tasks(args.output_task_id, args.skip_duplicates, args.output_format)
 
 
 if __name__ == "__main__":
@@ -8,6 +8,8 @@
 
 import os
 import argparse
+import queue
+import threading
 from typing import Optional
 from reddit_html_crawler import RedditHTMLCrawler
 from comment_filter import CommentFilter
@@ -34,22 +36,32 @@ class NewPipeline:
         self.posts_dir = os.path.join(self.data_dir, "ready_for_DB_posts")
         self.comments_dir = os.path.join(self.data_dir, "ready_for_DB_comments")
         self.classifier_output_dir = os.path.join(self.data_dir, "classifier_output")
-        self.created_files = []  # 记录已创建的文件，用于失败时清理
+        # 各步骤输出文件路径（统一在此计算，保证标记和清理使用同一路径字符串）
+        self._raw_out = os.path.join(self.raw_dir, f"{task_id}.json")
+        self._filtered_out = os.path.join(self.filtered_dir, f"{task_id}.json")
+        self._classifier_out = os.path.join(self.classifier_output_dir, f"{task_id}_classifier.json")
+        self._posts_out = os.path.join(self.posts_dir, f"{task_id}_posts.json")
+        self._comments_out = os.path.join(self.comments_dir, f"{task_id}_comments.json")
+        self.created_files = set()  # 记录已创建的文件，用于失败时清理
+        self.created_files_lock = threading.Lock()  # 流水线阶段可能在多个线程中标记文件
         
         # 加载环境变量
         load_dotenv()
     
     def _mark_file_created(self, filepath: str):
         """标记文件已创建"""
-        if filepath not in self.created_files:
-            self.created_files.append(filepath)
+        with self.created_files_lock:
+            self.created_files.add(filepath)
     
     def _cleanup_on_failure(self):
         """失败时清理所有已创建的文件"""
         print("\n" + "=" * 80)
         print("管线执行失败，开始清理已创建的文件...")
         
-        for filepath in self.created_files:
+        with self.created_files_lock:
+            created_files = list(self.created_files)
+        
+        for filepath in created_files:
             try:
                 if os.path.exists(filepath):
                     os.remove(filepath)
@@ -110,30 +122,22 @@ class NewPipeline:
             print(f"并发线程数: {threads}")
             
             # 批量爬取
-            data = crawler.crawl_batch(query_seeds, filter_keywords, max_first_level_comments=max_first_level_comments, num_threads=threads)
+            try:
+                data = crawler.crawl_batch(query_seeds, filter_keywords, max_first_level_comments=max_first_level_comments, num_threads=threads)
+            finally:
+                # 爬取结束（包括出错时），后续步骤不再访问Reddit，释放连接池
+                RedditHTMLCrawler.close_shared_session()
             
             if not data:
                 raise ValueError("未找到匹配的帖子")
             
-            # 保存数据
-            crawler.save_to_json(data, self.task_id)
+            # 保存数据（同时返回第一层评论数和总评论数，无需再遍历评论树）
+            first_level_comments, total_comments = crawler.save_to_json(data, self.task_id)
             
             # 标记文件已创建
-            raw_file = os.path.join(self.raw_dir, f"{self.task_id}.json")
-            self._mark_file_created(raw_file)
+            self._mark_file_created(self._raw_out)
             
             # 统计信息
-            def count_comments(comments_tree):
-                if not comments_tree:
-                    return 0
-                count = len(comments_tree)
-                for comment in comments_tree:
-                    if isinstance(comment, dict) and 'replies' in comment:
-                        count += count_comments(comment.get('replies', []))
-                return count
-            
-            total_comments = sum(count_comments(post.get('comments_tree', [])) for post in data)
-            first_level_comments = sum(len(post.get('comments_tree', [])) for post in data)
             print(f"\n统计信息:")
             print(f"  - 原始帖子数: {len(data)}")
             print(f"  - 第一层评论数: {first_level_comments}")
@@ -174,8 +178,7 @@ class NewPipeline:
             filter.save_filtered_data(self.task_id, filtered_data)
             
             # 标记文件已创建
-            filtered_file = os.path.join(self.filtered_dir, f"{self.task_id}.json")
-            self._mark_file_created(filtered_file)
+            self._mark_file_created(self._filtered_out)
             
             print("\n✓ 步骤2完成")
             return True
@@ -211,8 +214,7 @@ class NewPipeline:
             classifier.classify_task(self.task_id, max_chars=max_chars, num_threads=num_threads)
             
             # 标记文件已创建
-            classifier_file = os.path.join(self.classifier_output_dir, f"{self.task_id}_classifier.json")
-            self._mark_file_created(classifier_file)
+            self._mark_file_created(self._classifier_out)
             
             print("\n✓ 步骤3完成")
             return True
@@ -244,14 +246,12 @@ class NewPipeline:
             # 保存posts数据
             if posts:
                 preparer.save_posts(self.task_id, posts)
-                posts_file = os.path.join(self.posts_dir, f"{self.task_id}_posts.json")
-                self._mark_file_created(posts_file)
+                self._mark_file_created(self._posts_out)
             
             # 保存comments数据
             if comments:
                 preparer.save_comments(self.task_id, comments)
-                comments_file = os.path.join(self.comments_dir, f"{self.task_id}_comments.json")
-                self._mark_file_created(comments_file)
+                self._mark_file_created(self._comments_out)
             
             print("\n✓ 步骤3完成")
             return True
@@ -262,6 +262,116 @@ class NewPipeline:
             traceback.print_exc()
             return False
     
+    def step2to4_pipelined(self, max_second_level: int = 5, max_chars: Optional[int] = None,
+                           num_threads: int = 16) -> bool:
+        """
+        步骤2-4流水线执行：过滤 → 分类 → 准备数据库数据
+        每过滤完一个项目就提交分类请求，分类结果一返回就转换为入库格式，
+        总耗时约为各步骤中最慢者（通常是分类的网络请求），而不是三者之和
+        
+        Args:
+            max_second_level: 最多保留的二级评论数
+            max_chars: 分类时的最大字符数限制
+            num_threads: 分类并发线程数
+            
+        Returns:
+            是否成功
+        """
+        try:
+            print("\n" + "=" * 80)
+            print("步骤2-4: 过滤评论 → 分类一级评论 → 准备数据库数据（流水线并行）")
+            print("=" * 80)
+            
+            # 获取API密钥
+            api_key = os.getenv('DEEPSEEK_API_KEY')
+            if not api_key:
+                raise ValueError("未找到 DEEPSEEK_API_KEY 环境变量，请在 .env 文件中配置")
+            
+            comment_filter = CommentFilter()
+            classifier = CommentClassifier(api_key)
+            preparer = DBDataPreparer()
+            
+            # 生产者：过滤后的项目边产出边交给分类器
+            filtered_data = []
+            item_order = {}
+            
+            def iter_filtered():
+                for item in comment_filter.iter_filter_task(self.task_id, max_second_level=max_second_level):
+                    item_order[id(item)] = len(filtered_data)
+                    filtered_data.append(item)
+                    yield item
+            
+            # 消费者：分类结果通过有界队列流入，立即转换为入库格式
+            result_queue = queue.Queue(maxsize=num_threads * 4)
+            prepared = []
+            
+            def prepare_worker():
+                while True:
+                    entry = result_queue.get()
+                    if entry is None:
+                        break
+                    item, result = entry
+                    comment_id = item.get('source_platform_id', '')
+                    try:
+                        post_record, item_comments = preparer.prepare_item(item, {comment_id: result} if result else {})
+                        prepared.append((item_order[id(item)], post_record, item_comments))
+                    except Exception as e:
+                        print(f"  ⚠️  处理项目 {comment_id} 时出错: {e}")
+            
+            consumer = threading.Thread(target=prepare_worker, daemon=True)
+            consumer.start()
+            try:
+                classifier_results = classifier.classify_items(
+                    iter_filtered(),
+                    max_chars=max_chars,
+                    num_threads=num_threads,
+                    on_result=lambda item, result: result_queue.put((item, result))
+                )
+            finally:
+                result_queue.put(None)
+                consumer.join()
+            
+            if not filtered_data:
+                raise ValueError("过滤后数据为空")
+            
+            # 保存过滤后的数据
+            comment_filter.save_filtered_data(self.task_id, filtered_data)
+            self._mark_file_created(self._filtered_out)
+            
+            # 保存分类结果
+            classifier.save_classifier_output(self.task_id, classifier_results)
+            self._mark_file_created(self._classifier_out)
+            
+            # 按过滤顺序还原入库数据
+            prepared.sort(key=lambda entry: entry[0])
+            posts = [post_record for _, post_record, _ in prepared]
+            comments = [comment for _, _, item_comments in prepared for comment in item_comments]
+            print(f"\n✓ 数据准备完成")
+            print(f"  - Posts: {len(posts)}")
+            print(f"  - Comments: {len(comments)}")
+            
+            if not posts and not comments:
+                raise ValueError("没有数据需要保存")
+            
+            # 保存posts数据
+            if posts:
+                preparer.save_posts(self.task_id, posts)
+                self._mark_file_created(self._posts_out)
+            
+            # 保存comments数据
+            if comments:
+                preparer.save_comments(self.task_id, comments)
+                self._mark_file_created(self._comments_out)
+            
+            print("\n✓ 步骤2-4完成")
+            return True
+            
+        except Exception as e:
+            print(f"\n✗ 步骤2-4失败: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+    
     def run(self, query_seeds_file: str = 'to_craw_query_seeds.txt',
             keywords_file: str = 'filter_keywords.txt',
             delay: float = 0.5,
@@ -294,6 +404,7 @@ class NewPipeline:
         print("  2. 过滤评论 (comment_filter)")
         print("  3. 分类一级评论 (comment_classifier)")
         print("  4. 准备数据库数据 (prepare_for_db)")
+        print("  （步骤2-4流水线重叠执行）")
         print("=" * 80)
         
         # 步骤1：爬取
@@ -301,18 +412,9 @@ class NewPipeline:
             self._cleanup_on_failure()
             return False
         
-        # 步骤2：过滤
-        if not self.step2_filter(max_second_level):
-            self._cleanup_on_failure()
-            return False
-        
-        # 步骤3：分类
-        if not self.step3_classify(max_chars=max_chars, num_threads=classify_threads):
-            self._cleanup_on_failure()
-            return False
-        
-        # 步骤4：准备数据库数据
-        if not self.step4_prepare_db(use_classifier=True):
+        # 步骤2-4：过滤、分类、准备数据库数据（流水线重叠执行）
+        if not self.step2to4_pipelined(max_second_level=max_second_level, max_chars=max_chars,
+                                       num_threads=classify_threads):
             self._cleanup_on_failure()
             return False
         
@@ -320,8 +422,8 @@ class NewPipeline:
         print("✓ 新数据管线执行成功！")
         print("=" * 80)
         print(f"\n输出文件:")
-        print(f"  - Posts: Data/ready_for_DB_posts/{self.task_id}_posts.json")
-        print(f"  - Comments: Data/ready_for_DB_comments/{self.task_id}_comments.json")
+        print(f"  - Posts: {self._posts_out}")
+        print(f"  - Comments: {self._comments_out}")
         print("\n可以开始导入到Supabase数据库了")
         
         return True
@@ -5,15 +5,134 @@
 功能：解析 format_content_tree.py 生成的格式化字符串，还原为结构化数据
 """
 
+import re
+import json
 from typing import Dict, List, Any, Optional, Tuple
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_INDENT_SIZE = 4  # 每层评论缩进4个空格
+_BODY_OFFSET = 6  # BODY多行内容相对评论缩进再缩进6个空格
+
+# 行标记编码（与 _LINE_RE 的分组序号一致）：普通行 / [COMMENT] / [/COMMENT] / [/COMMENTS]
+_TAG_NONE = 1
+_TAG_COMMENT = 2
+_TAG_COMMENT_END = 3
+_TAG_COMMENTS_END = 4
+
+# 每行：行首空白（不跨行）+ 可选的独占一行的评论结构标记；re.M 下 ^ 匹配每一行的开头，包括末尾换行后的空行
+# 标记只在去掉首尾空白后整行相等时才算命中，与 line.strip() == '[COMMENT]' 等判断一致
+_LINE_RE = re.compile(
+    r'^([^\S\n]*)(?:(?:(\[COMMENT\])|(\[/COMMENT\])|(\[/COMMENTS\]))[^\S\n]*$)?',
+    re.M
+)
+
+
+def _line_table(content: str) -> Tuple[List[int], List[int], List[int]]:
+    """
+    单次扫描得到每行的起始偏移、缩进宽度和结构标记（代替 content.split('\\n')、逐行 lstrip 和逐行 strip 比较）
+    
+    逐字符的检查都在正则引擎（C层）中完成，解析循环只需按下标读取
+    
+    Args:
+        content: 原始字符串
+        
+    Returns:
+        (offsets, indents, tags)：第k行为 content[offsets[k]:offsets[k + 1] - 1]，
+        其行首空白宽度为 indents[k]，标记编码为 tags[k]（见 _TAG_*），共 len(indents) 行
+    """
+    offsets = []
+    indents = []
+    tags = []
+    for m in _LINE_RE.finditer(content):
+        start = m.start()
+        offsets.append(start)
+        indents.append(m.end(1) - start)
+        tags.append(m.lastindex)
+    offsets.append(len(content) + 1)
+    return offsets, indents, tags
+
+
+def _body_text(content: str, offsets: List[int], value: str, first: int, last: int, body_indent: int) -> str:
+    """
+    从原始字符串中一次切出BODY内容
+    
+    结果等价于把 BODY: 后的值与第 first 到 last - 1 行（各去掉 body_indent 个字符的缩进）用换行连接后 strip。
+    常见情况下这些内容在原串中是连续的一段，只需一次切片并去掉每行的空格缩进；
+    BODY: 行带尾随空白或续行缩进不全是空格时，逐行切片拼接。
+    
+    Args:
+        content: 原始字符串
+        offsets: 行起始偏移列表（见 _line_table）
+        value: BODY: 行上去掉首尾空白后的值
+        first: 第一行续行的索引（即 BODY: 行的下一行）
+        last: 最后一行续行之后的索引
+        body_indent: 续行的缩进宽度
+        
+    Returns:
+        BODY内容
+    """
+    value_end = offsets[first] - 1  # BODY: 行的换行符位置
+    if first == last:
+        return value
+    
+    nl_pad = '\n' + ' ' * body_indent
+    value_start = value_end - len(value)
+    if content.startswith(value, value_start):
+        text = content[value_start:offsets[last] - 1]
+        if text.count(nl_pad) == last - first:
+            return text.replace(nl_pad, '\n').strip()
+    
+    parts = [value] if value else []
+    parts.extend(content[offsets[k] + body_indent:offsets[k + 1] - 1] for k in range(first, last))
+    return '\n'.join(parts).strip()
+
+
+def _to_bool(value: str) -> bool:
+    """IS_SUBMITTER字段值转换"""
+    return value.lower() == 'true'
+
+
+# int() 接受的十进制整数写法（可带正负号、数字间单个下划线），用于事先判断而不依赖异常
+_INT_RE = re.compile(r'[+-]?\d(?:_?\d)*')
+
+
+def _to_int(value: str) -> int:
+    """SCORE字段值转换，非法值记为0"""
+    if value.isdecimal():
+        return int(value)
+    if _INT_RE.fullmatch(value):
+        return int(value)
+    return 0
+
 
 class ContentTreeParser:
     """评论树解析器"""
     
+    # 评论字段标记 -> (字段名, 值转换函数)；BODY的转换函数为None，表示进入多行正文
+    _FIELD_HANDLERS = {
+        'COMMENT_ID': ('comment_id', str),
+        'AUTHOR_ID': ('author_id', str),
+        'IS_SUBMITTER': ('is_submitter', _to_bool),
+        'SCORE': ('score', _to_int),
+        'CREATED_UTC': ('created_utc', str),
+        'BODY': ('body', None),
+    }
+    
+    # 块开始标记 -> (结果字段名, 块结束标记)
+    _BLOCK_SENTINELS = {
+        '[POST_TITLE]': ('title', '[/POST_TITLE]'),
+        '[POST_AUTHOR]': ('author', '[/POST_AUTHOR]'),
+        '[POST_CONTENT]': ('content', '[/POST_CONTENT]'),
+    }
+    
     def __init__(self):
         """初始化解析器"""
-        self.indent_size = 4  # 每层缩进4个空格
+        self.indent_size = _INDENT_SIZE  # 每层缩进4个空格
     
     def parse(self, content: str) -> Dict[str, Any]:
         """
@@ -46,7 +165,7 @@ class ContentTreeParser:
                 ]
             }
         """
-        lines = content.split('\n')
+        offsets, indents, tags = _line_table(content)
         result = {
             'title': None,
             'author': {},
@@ -54,115 +173,124 @@ class ContentTreeParser:
             'comments': []
         }
         
+        # 单次扫描：每行只strip一次，遇到块开始标记切换状态，遇到对应结束标记收尾
+        block_sentinels = self._BLOCK_SENTINELS
+        n = len(offsets) - 1
+        block = None  # 当前所在块的字段名（title / author / content）
+        block_end = None
+        block_lines = []
+        
         i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # 解析帖子标题
-            if line == '[POST_TITLE]':
-                i += 1
-                title_lines = []
-                while i < len(lines) and lines[i].strip() != '[/POST_TITLE]':
-                    title_lines.append(lines[i])
-                    i += 1
-                result['title'] = '\n'.join(title_lines).strip()
-                i += 1
-                continue
-            
-            # 解析发帖者信息
-            if line == '[POST_AUTHOR]':
-                i += 1
-                while i < len(lines) and lines[i].strip() != '[/POST_AUTHOR]':
-                    author_line = lines[i].strip()
-                    if author_line.startswith('AUTHOR_NAME:'):
-                        result['author']['name'] = author_line.split(':', 1)[1].strip()
-                    elif author_line.startswith('AUTHOR_HANDLE:'):
-                        result['author']['handle'] = author_line.split(':', 1)[1].strip()
-                    i += 1
-                i += 1
-                continue
-            
-            # 解析帖子内容
-            if line == '[POST_CONTENT]':
-                i += 1
-                content_lines = []
-                while i < len(lines) and lines[i].strip() != '[/POST_CONTENT]':
-                    content_lines.append(lines[i])
-                    i += 1
-                result['content'] = '\n'.join(content_lines).strip()
-                i += 1
-                continue
+        while i < n:
+            line = content[offsets[i]:offsets[i + 1] - 1]
+            stripped = line.strip()
             
-            # 解析评论树
-            if line == '[COMMENTS]':
-                i += 1
-                comments, i = self._parse_comments(lines, i, depth=0)
-                result['comments'] = comments
-                i += 1  # 跳过 [/COMMENTS]
-                continue
+            if block is None:
+                # 解析评论树
+                if stripped == '[COMMENTS]':
+                    comments, i = self._parse_comments(content, offsets, indents, tags, i + 1)
+                    result['comments'] = comments
+                    i += 1  # 跳过 [/COMMENTS]
+                    continue
+                
+                sentinel = block_sentinels.get(stripped)
+                if sentinel is not None:
+                    block, block_end = sentinel
+                    block_lines = []
+            elif stripped == block_end:
+                if block != 'author':
+                    result[block] = '\n'.join(block_lines).strip()
+                block = None
+            elif block == 'author':
+                # 发帖者信息
+                if stripped.startswith('AUTHOR_NAME:'):
+                    result['author']['name'] = stripped.split(':', 1)[1].strip()
+                elif stripped.startswith('AUTHOR_HANDLE:'):
+                    result['author']['handle'] = stripped.split(':', 1)[1].strip()
+            else:
+                # 标题/正文保留原始行
+                block_lines.append(line)
             
             i += 1
         
+        # 块未闭合时，已读取的内容仍然有效
+        if block is not None and block != 'author':
+            result[block] = '\n'.join(block_lines).strip()
+        
         return result
     
-    def _parse_comments(self, lines: List[str], start_idx: int, depth: int) -> Tuple[List[Dict], int]:
+    def _parse_comments(self, content: str, offsets: List[int], indents: List[int], tags: List[int], start_idx: int) -> Tuple[List[Dict], int]:
         """
-        递归解析评论树
+        解析评论树（显式栈迭代，不受递归深度限制）
+        
+        栈中每一帧为 (评论列表, 深度)，栈顶即当前正在收集评论的层级。
+        遇到缩进小于当前层级的非空行时弹栈，并在上一层重新处理该行。
         
         Args:
-            lines: 所有行的列表
+            content: 原始字符串
+            offsets: 行起始偏移列表（见 _line_table）
+            indents: 每行缩进宽度列表（见 _line_table）
+            tags: 每行结构标记编码列表（见 _line_table）
             start_idx: 开始索引
-            depth: 当前深度
             
         Returns:
-            (评论列表, 下一个索引)
+            (顶层评论列表, [/COMMENTS] 所在索引)
         """
         comments = []
+        stack = [(comments, 0)]
         i = start_idx
-        expected_indent = depth * self.indent_size
+        n = len(offsets) - 1
         
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
+        while i < n:
+            tag = tags[i]
             
             # 检查是否到达评论树结束标记
-            if stripped == '[/COMMENTS]':
+            if tag == _TAG_COMMENTS_END:
                 break
             
-            # 检查是否是当前层级的评论
-            current_indent = len(line) - len(line.lstrip())
+            siblings, depth = stack[-1]
+            expected_indent = depth * _INDENT_SIZE
+            current_indent = indents[i]
             
-            # 如果缩进小于预期，说明已经回到上一层或更高层
-            if current_indent < expected_indent and stripped:
-                break
+            # 如果缩进小于预期，说明已经回到上一层或更高层（顶层缩进为0，不会弹空）
+            # 缩进等于行长即空白行，不影响层级
+            if current_indent < expected_indent and current_indent != offsets[i + 1] - 1 - offsets[i]:
+                stack.pop()
+                continue
             
-            # 如果缩进大于预期，说明是子评论，跳过（由递归处理）
+            # 如果缩进大于预期，说明不属于当前层级，跳过
             if current_indent > expected_indent:
                 i += 1
                 continue
             
             # 解析单个评论
-            if stripped == '[COMMENT]':
-                comment, i = self._parse_single_comment(lines, i, depth)
-                if comment:
-                    comments.append(comment)
+            if tag == _TAG_COMMENT:
+                comment, i = self._parse_single_comment(content, offsets, indents, tags, i, depth)
+                siblings.append(comment)
+                
+                # [/COMMENT] 后紧跟下一层缩进的 [COMMENT]，进入子评论层级
+                if i < n and tags[i] == _TAG_COMMENT and indents[i] == expected_indent + _INDENT_SIZE:
+                    stack.append((comment['replies'], depth + 1))
                 continue
             
             i += 1
         
         return comments, i
     
-    def _parse_single_comment(self, lines: List[str], start_idx: int, depth: int) -> Tuple[Dict, int]:
+    def _parse_single_comment(self, content: str, offsets: List[int], indents: List[int], tags: List[int], start_idx: int, depth: int) -> Tuple[Dict, int]:
         """
-        解析单个评论
+        解析单个评论的字段（子评论由 _parse_comments 处理）
         
         Args:
-            lines: 所有行的列表
+            content: 原始字符串
+            offsets: 行起始偏移列表（见 _line_table）
+            indents: 每行缩进宽度列表（见 _line_table）
+            tags: 每行结构标记编码列表（见 _line_table）
             start_idx: [COMMENT] 标记的索引
             depth: 当前深度
             
         Returns:
-            (评论字典, 下一个索引)
+            (评论字典, [/COMMENT] 之后的索引)
         """
         comment = {
             'comment_id': None,
@@ -175,74 +303,50 @@ class ContentTreeParser:
         }
         
         i = start_idx + 1  # 跳过 [COMMENT]
-        indent = depth * self.indent_size
-        body_lines = []
+        body_indent = depth * _INDENT_SIZE + _BODY_OFFSET  # BODY多行内容的缩进
+        field_handlers = self._FIELD_HANDLERS
+        body_value = None  # BODY: 行上的值，None表示还没有遇到BODY字段
+        body_first = body_last = 0  # BODY续行的索引范围 [body_first, body_last)
         in_body = False
+        n = len(offsets) - 1
         
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
-            
+        while i < n:
             # 检查是否到达评论结束标记
-            if stripped == '[/COMMENT]':
+            if tags[i] == _TAG_COMMENT_END:
                 # 如果有未处理的body内容，处理它
-                if body_lines:
-                    comment['body'] = '\n'.join(body_lines).strip()
+                if body_value or body_last > body_first:
+                    comment['body'] = _body_text(content, offsets, body_value, body_first, body_last, body_indent)
                 i += 1
                 break
             
-            # 解析字段
-            if stripped.startswith('COMMENT_ID:'):
-                comment['comment_id'] = stripped.split(':', 1)[1].strip()
-                in_body = False
-            elif stripped.startswith('AUTHOR_ID:'):
-                comment['author_id'] = stripped.split(':', 1)[1].strip()
-                in_body = False
-            elif stripped.startswith('IS_SUBMITTER:'):
-                value = stripped.split(':', 1)[1].strip().lower()
-                comment['is_submitter'] = (value == 'true')
-                in_body = False
-            elif stripped.startswith('SCORE:'):
-                try:
-                    comment['score'] = int(stripped.split(':', 1)[1].strip())
-                except ValueError:
-                    comment['score'] = 0
-                in_body = False
-            elif stripped.startswith('CREATED_UTC:'):
-                comment['created_utc'] = stripped.split(':', 1)[1].strip()
-                in_body = False
-            elif stripped.startswith('BODY:'):
-                # BODY字段开始
-                body_content = stripped.split(':', 1)[1].strip()
-                body_lines = [body_content] if body_content else []
-                in_body = True
+            line = content[offsets[i]:offsets[i + 1] - 1]
+            stripped = line.strip()
+            
+            # 解析字段：只在第一个冒号处切分一次，按字段标记查表
+            colon = stripped.find(':')
+            handler = field_handlers.get(stripped[:colon]) if colon > 0 else None
+            if handler is not None:
+                key, convert = handler
+                value = stripped[colon + 1:].strip()
+                if convert is None:
+                    # BODY字段开始，续行从下一行起连续排列
+                    body_value = value
+                    body_first = body_last = i + 1
+                    in_body = True
+                else:
+                    comment[key] = convert(value)
+                    in_body = False
             elif in_body:
                 # BODY的多行内容（缩进6个空格）
-                line_indent = len(line) - len(line.lstrip())
-                if line_indent >= indent + 6:
-                    # 移除缩进
-                    body_lines.append(line[(indent + 6):])
+                if indents[i] >= body_indent:
+                    # 只记录范围，结束时一次切出
+                    body_last = i + 1
                 else:
-                    # 如果缩进不对，说明body结束了
+                    # 如果缩进不对，说明body结束了；该行已确认不是字段，直接跳过
                     in_body = False
-                    # 回退一行，重新解析
-                    i -= 1
-                    continue
             
             i += 1
         
-        # 解析子评论（replies）
-        if i < len(lines):
-            # 检查下一行是否是子评论
-            next_line = lines[i] if i < len(lines) else ''
-            next_indent = len(next_line) - len(next_line.lstrip())
-            next_depth = depth + 1
-            expected_next_indent = next_depth * self.indent_size
-            
-            if next_indent == expected_next_indent and next_line.strip() == '[COMMENT]':
-                replies, i = self._parse_comments(lines, i, depth + 1)
-                comment['replies'] = replies
-        
         return comment, i
     
     def to_dict(self, content: str) -> Dict[str, Any]:
@@ -257,19 +361,23 @@ class ContentTreeParser:
         """
         return self.parse(content)
     
-    def to_json(self, content: str) -> str:
+    def to_json(self, content: str, pretty: bool = False) -> str:
         """
         解析并返回JSON格式
         
         Args:
             content: 格式化的字符串
+            pretty: 是否缩进输出（便于阅读）；默认输出紧凑JSON，安装了orjson时使用orjson编码
             
         Returns:
             JSON字符串
         """
-        import json
         result = self.parse(content)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        if pretty:
+            return json.dumps(result, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            return orjson.dumps(result).decode('utf-8')
+        return json.dumps(result, ensure_ascii=False, separators=(',', ':'))
 
 
 def parse_content_tree(content: str) -> Dict[str, Any]:
@@ -298,6 +406,8 @@ def main():
                        help='输出JSON文件路径（默认输出到stdout）')
     parser.add_argument('--format', choices=['dict', 'json'], default='json',
                        help='输出格式（默认json）')
+    parser.add_argument('--compact', action='store_true',
+                       help='输出紧凑JSON（默认缩进输出，便于阅读）')
     
     args = parser.parse_args()
     
@@ -310,9 +420,8 @@ def main():
         parser = ContentTreeParser()
         
         if args.format == 'json':
-            result = parser.to_json(content)
+            result = parser.to_json(content, pretty=not args.compact)
         else:
-            import json
             result = json.dumps(parser.parse(content), ensure_ascii=False, indent=2)
         
         # 输出
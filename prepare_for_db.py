@@ -8,12 +8,103 @@
 """
 
 import os
+import re
+import sys
 import json
 import argparse
 import hashlib
-from typing import List, Dict, Any, Optional
-from urllib.parse import urlparse, parse_qs
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import unquote_plus
 from datetime import datetime
+from json_loader import load_json_file
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 所有记录共用的字段值，驻留后各记录引用同一个字符串对象
+_PLATFORM_REDDIT = sys.intern("reddit")
+_DELETED = sys.intern("[deleted]")
+_LANG_EN = sys.intern("en")
+
+# 查询串中的q参数（与 parse_qs 一致：按 & 分隔，值中的 + 解码为空格）
+_Q_RE = re.compile(r'(?:^|&)q=([^&]*)')
+
+# 空内容的hash，直接返回常量，不必每次计算
+_EMPTY_CONTENT_HASH = hashlib.blake2b(b'', digest_size=16).hexdigest()
+
+
+@dataclass(slots=True)
+class PostRecord:
+    """crawled_posts入库记录（字段顺序即输出JSON的键顺序）"""
+    platform: str = _PLATFORM_REDDIT
+    source_url: str = ''
+    source_platform_id: str = ''
+    content_hash: str = _EMPTY_CONTENT_HASH
+    title: str = ''
+    content_text: str = ''
+    lang: str = _LANG_EN
+    media_urls: List[str] = field(default_factory=list)
+    author_name: str = _DELETED
+    author_handle: str = _DELETED
+    author_followers: Optional[int] = None
+    author_profile: Optional[str] = None
+    likes: int = 0
+    comments_count: int = 0
+    saves: Optional[int] = None
+    views: Optional[int] = None
+    scene: Optional[str] = None
+    sub_scene: Optional[str] = None
+    post_type: Optional[str] = None
+    base_quality_score: float = 0.0
+    is_source_available: bool = True
+    last_checked_at: Optional[str] = None
+    processed: bool = False
+    fetched_at: Optional[str] = None
+    subtitle_text: Optional[str] = None
+    query_seed: Optional[str] = None
+    content_type: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为入库使用的字典"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class CommentRecord:
+    """crawled_comments入库记录（字段顺序即输出JSON的键顺序）"""
+    post_id: Optional[str] = None  # 入库时关联
+    parent_comment_id: Optional[str] = None  # 入库时关联，这里先设为None
+    platform: str = _PLATFORM_REDDIT
+    source_comment_id: str = ''
+    content_text: str = ''
+    author_name: str = _DELETED
+    author_handle: str = _DELETED
+    likes: int = 0
+    replies_count: int = 0
+    published_at: Optional[str] = None
+    fetched_at: Optional[str] = None
+    # 父评论的原始ID（source_comment_id），入库时用于关联；二级评论没有
+    _parent_source_comment_id: Optional[str] = None
+    # 一级评论的ID（post的source_platform_id），入库时用于关联
+    _post_source_platform_id: str = ''
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为入库使用的字典（没有父评论时不输出 _parent_source_comment_id）"""
+        record = {name: getattr(self, name) for name in self.__slots__}
+        if not self._parent_source_comment_id:
+            del record['_parent_source_comment_id']
+        return record
+
+
+def _record_to_dict(obj: Any) -> Dict[str, Any]:
+    """JSON序列化时的default回调，将入库记录转换为字典"""
+    if isinstance(obj, (PostRecord, CommentRecord)):
+        return obj.to_dict()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
 
 
 class DBDataPreparer:
@@ -46,12 +137,11 @@ class DBDataPreparer:
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"过滤后的数据文件不存在: {filepath}")
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_json_file(filepath)
     
     def _calculate_content_hash(self, content: str) -> str:
         """
-        计算内容的hash
+        计算内容的hash（BLAKE2b，16字节摘要，与原MD5同为32位十六进制）
         
         Args:
             content: 内容字符串
@@ -60,8 +150,8 @@ class DBDataPreparer:
             hash字符串
         """
         if not content:
-            return hashlib.md5(b'').hexdigest()
-        return hashlib.md5(content.encode('utf-8')).hexdigest()
+            return _EMPTY_CONTENT_HASH
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
     
     def _extract_query_seed(self, source_url: str) -> Optional[str]:
         """
@@ -73,13 +163,15 @@ class DBDataPreparer:
         Returns:
             query_seed或None
         """
-        try:
-            parsed = urlparse(source_url)
-            query_params = parse_qs(parsed.query)
-            if 'q' in query_params:
-                return query_params['q'][0]
-        except Exception:
-            pass
+        if not source_url:
+            return None
+        
+        # 只在 ? 与 # 之间的查询串中查找，跳过空值（与 urlparse + parse_qs 行为一致）
+        query = source_url.partition('#')[0].partition('?')[2]
+        for match in _Q_RE.finditer(query):
+            value = match.group(1)
+            if value:
+                return unquote_plus(value)
         return None
     
     def _parse_timestamp(self, timestamp_str: str) -> Optional[str]:
@@ -99,13 +191,10 @@ class DBDataPreparer:
             # 如果已经是ISO格式，直接返回
             if 'T' in timestamp_str:
                 return timestamp_str
-            # 如果是Unix时间戳
-            if timestamp_str.isdigit():
-                return datetime.fromtimestamp(int(timestamp_str)).isoformat()
-        except Exception:
-            pass
-        
-        return timestamp_str
+            # 如果是Unix时间戳（直接尝试转换，不再先用isdigit扫描一遍）
+            return datetime.fromtimestamp(int(timestamp_str)).isoformat()
+        except (TypeError, ValueError, OverflowError, OSError):
+            return timestamp_str
     
     def _count_replies(self, comment: Dict[str, Any]) -> int:
         """
@@ -126,7 +215,29 @@ class DBDataPreparer:
             count += self._count_replies(reply)
         return count
     
-    def convert_first_level_to_post(self, item: Dict[str, Any], classifier_results: Dict[str, Dict[str, Any]] = None) -> Dict[str, Any]:
+    def _compute_reply_counts(self, root: Dict[str, Any]) -> Dict[int, int]:
+        """
+        一次后序遍历计算子树中每条评论的回复总数（包括所有子评论）
+        
+        Args:
+            root: 根评论字典
+            
+        Returns:
+            {id(评论字典): 回复总数}，以对象身份为键，不受评论ID缺失或重复影响
+        """
+        counts = {}
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            replies = node.get('replies', [])
+            if children_done:
+                counts[id(node)] = sum(1 + counts[id(reply)] for reply in replies)
+            else:
+                stack.append((node, True))
+                stack.extend((reply, False) for reply in replies)
+        return counts
+    
+    def convert_first_level_to_post(self, item: Dict[str, Any], classifier_results: Dict[str, Dict[str, Any]] = None) -> PostRecord:
         """
         将一级评论转换为post格式
         
@@ -135,7 +246,7 @@ class DBDataPreparer:
             classifier_results: 分类结果字典 {comment_id: result}
             
         Returns:
-            post格式的字典
+            post记录
         """
         comments_tree = item.get('comments_tree', [])
         if not comments_tree:
@@ -168,7 +279,7 @@ class DBDataPreparer:
         # 转换lang
         lang = item.get('lang', 'english')
         if lang == 'english':
-            lang = 'en'
+            lang = _LANG_EN
         
         # 统计二级评论数
         second_level_count = len(first_level_comment.get('replies', []))
@@ -177,119 +288,80 @@ class DBDataPreparer:
         comment_id = first_level_comment.get('id', '')
         classifier_result = classifier_results.get(comment_id, {}) if classifier_results else {}
         
+        author = first_level_comment.get('author', _DELETED)
+        
         # 构建post记录
-        post_record = {
-            "platform": "reddit",
-            "source_url": source_url,
-            "source_platform_id": first_level_comment.get('id', ''),
-            "content_hash": content_hash,
-            "title": title,
-            "content_text": content_text,
-            "lang": lang,
-            "media_urls": item.get('media_urls', []),
-            "author_name": first_level_comment.get('author', '[deleted]'),
-            "author_handle": first_level_comment.get('author', '[deleted]'),
-            "author_followers": None,
-            "author_profile": first_level_comment.get('author_profile', None),  # 从一级评论中获取author_profile
-            "likes": first_level_comment.get('score', 0),
-            "comments_count": second_level_count,
-            "saves": None,
-            "views": None,
-            "scene": classifier_result.get('scene'),
-            "sub_scene": None,
-            "post_type": classifier_result.get('post_type'),
-            "base_quality_score": float(classifier_result.get('base_quality_score', 0.0)),
-            "is_source_available": True,
-            "last_checked_at": None,
-            "processed": False,
-            "fetched_at": self._parse_timestamp(item.get('fetched_at', '')),
-            "subtitle_text": None,
-            "query_seed": query_seed,
-            "content_type": None
-        }
+        post_record = PostRecord(
+            source_url=source_url,
+            source_platform_id=first_level_comment.get('id', ''),
+            content_hash=content_hash,
+            title=title,
+            content_text=content_text,
+            lang=lang,
+            media_urls=item.get('media_urls', []),
+            author_name=author,
+            author_handle=author,
+            author_profile=first_level_comment.get('author_profile', None),  # 从一级评论中获取author_profile
+            likes=first_level_comment.get('score', 0),
+            comments_count=second_level_count,
+            scene=classifier_result.get('scene'),
+            post_type=classifier_result.get('post_type'),
+            base_quality_score=float(classifier_result.get('base_quality_score', 0.0)),
+            fetched_at=self._parse_timestamp(item.get('fetched_at', '')),
+            query_seed=query_seed
+        )
         
         return post_record
     
     def extract_all_second_level_comments(self, first_level_comment: Dict[str, Any], 
                                          post_source_platform_id: str,
-                                         fetched_at: str) -> List[Dict[str, Any]]:
+                                         fetched_at: str,
+                                         reply_counts: Optional[Dict[int, int]] = None) -> List[CommentRecord]:
         """
-        递归提取所有二级及更深层级的评论
+        提取所有二级及更深层级的评论（显式栈深度优先遍历，输出顺序与逐层递归一致）
         
         Args:
             first_level_comment: 一级评论字典
             post_source_platform_id: 一级评论的ID（作为post的source_platform_id）
             fetched_at: 抓取时间
+            reply_counts: 预先计算的回复数（见 _compute_reply_counts），为None时在此计算
             
         Returns:
             所有二级及更深层级评论的列表
         """
-        comments = []
-        second_level_replies = first_level_comment.get('replies', [])
+        if reply_counts is None:
+            reply_counts = self._compute_reply_counts(first_level_comment)
         
-        for second_level_comment in second_level_replies:
-            comment_record = self._convert_comment_to_db_format(
-                second_level_comment,
-                post_source_platform_id=post_source_platform_id,
-                parent_comment_id=None,  # 二级评论的parent是None（因为一级评论是post）
-                fetched_at=fetched_at
-            )
-            comments.append(comment_record)
-            
-            # 递归处理更深层级的评论
-            deeper_comments = self._extract_deeper_comments(
-                second_level_comment,
-                post_source_platform_id=post_source_platform_id,
-                parent_comment_id=second_level_comment.get('id', ''),
-                fetched_at=fetched_at
-            )
-            comments.extend(deeper_comments)
+        # 同一post下所有评论的抓取时间相同，只解析一次
+        fetched_at = self._parse_timestamp(fetched_at)
         
-        return comments
-    
-    def _extract_deeper_comments(self, parent_comment: Dict[str, Any],
-                                post_source_platform_id: str,
-                                parent_comment_id: str,
-                                fetched_at: str) -> List[Dict[str, Any]]:
-        """
-        递归提取更深层级的评论（三级、四级等）
-        
-        Args:
-            parent_comment: 父评论字典
-            post_source_platform_id: 一级评论的ID（作为post的source_platform_id）
-            parent_comment_id: 父评论的ID
-            fetched_at: 抓取时间
-            
-        Returns:
-            更深层级评论的列表
-        """
         comments = []
-        replies = parent_comment.get('replies', [])
-        
-        for reply in replies:
-            comment_record = self._convert_comment_to_db_format(
-                reply,
+        # 栈元素为 (评论, 父评论ID)；二级评论的parent是None（因为一级评论是post）
+        # 子评论逆序入栈，保证按原顺序先序输出
+        stack = [(reply, None) for reply in reversed(first_level_comment.get('replies', []))]
+        
+        while stack:
+            comment, parent_comment_id = stack.pop()
+            comments.append(self._convert_comment_to_db_format(
+                comment,
                 post_source_platform_id=post_source_platform_id,
                 parent_comment_id=parent_comment_id,
-                fetched_at=fetched_at
-            )
-            comments.append(comment_record)
+                fetched_at=fetched_at,
+                reply_counts=reply_counts
+            ))
             
-            # 递归处理更深层级
-            deeper_comments = self._extract_deeper_comments(
-                reply,
-                post_source_platform_id=post_source_platform_id,
-                parent_comment_id=reply.get('id', ''),
-                fetched_at=fetched_at
-            )
-            comments.extend(deeper_comments)
+            replies = comment.get('replies', [])
+            if replies:
+                comment_id = comment.get('id', '')
+                stack.extend((reply, comment_id) for reply in reversed(replies))
         
         return comments
     
     def _convert_comment_to_db_format(self, comment: Dict[str, Any],
                                      post_source_platform_id: str,
                                      parent_comment_id: Optional[str],
-                                     fetched_at: str) -> Dict[str, Any]:
+                                     fetched_at: str,
+                                     reply_counts: Optional[Dict[int, int]] = None) -> CommentRecord:
         """
         将评论转换为数据库格式
         
@@ -297,35 +369,31 @@ class DBDataPreparer:
             comment: 评论字典
             post_source_platform_id: 一级评论的ID（作为post的source_platform_id）
             parent_comment_id: 父评论的ID（如果是二级评论则为None）
-            fetched_at: 抓取时间
+            fetched_at: 已解析的抓取时间（见 _parse_timestamp）
+            reply_counts: 预先计算的回复数（见 _compute_reply_counts），为None时递归计算
             
         Returns:
-            数据库格式的评论字典
+            评论记录
         """
-        replies_count = self._count_replies(comment)
-        
-        comment_record = {
-            "post_id": None,  # 入库时关联
-            "parent_comment_id": None,  # 入库时关联，这里先设为None
-            "platform": "reddit",
-            "source_comment_id": comment.get('id', ''),
-            "content_text": comment.get('body', ''),
-            "author_name": comment.get('author', '[deleted]'),
-            "author_handle": comment.get('author', '[deleted]'),
-            "likes": comment.get('score', 0),
-            "replies_count": replies_count,
-            "published_at": self._parse_timestamp(comment.get('created_utc', '')),
-            "fetched_at": self._parse_timestamp(fetched_at)
-        }
-        
-        # 保存parent_comment_id的原始值（source_comment_id），入库时用于关联
-        if parent_comment_id:
-            comment_record["_parent_source_comment_id"] = parent_comment_id
-        
-        # 保存post_source_platform_id，入库时用于关联
-        comment_record["_post_source_platform_id"] = post_source_platform_id
-        
-        return comment_record
+        if reply_counts is not None:
+            replies_count = reply_counts.get(id(comment), 0)
+        else:
+            replies_count = self._count_replies(comment)
+        
+        author = comment.get('author', _DELETED)
+        
+        return CommentRecord(
+            source_comment_id=comment.get('id', ''),
+            content_text=comment.get('body', ''),
+            author_name=author,
+            author_handle=author,
+            likes=comment.get('score', 0),
+            replies_count=replies_count,
+            published_at=self._parse_timestamp(comment.get('created_utc', '')),
+            fetched_at=fetched_at,
+            _parent_source_comment_id=parent_comment_id,
+            _post_source_platform_id=post_source_platform_id
+        )
     
     def load_classifier_results(self, task_id: str) -> Dict[str, Dict[str, Any]]:
         """
@@ -345,17 +413,41 @@ class DBDataPreparer:
             print(f"  ⚠️  分类结果文件不存在: {filepath}，将使用默认值")
             return {}
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            classifier_list = json.load(f)
+        classifier_list = load_json_file(filepath)
         
-        # 转换为字典格式
-        classifier_dict = {}
-        for item in classifier_list:
-            comment_id = item.get('id', '')
-            if comment_id:
-                classifier_dict[comment_id] = item
+        # 转换为字典格式（跳过没有ID的结果）
+        return {item['id']: item for item in classifier_list if item.get('id')}
+    
+    def prepare_item(self, item: Dict[str, Any],
+                     classifier_results: Dict[str, Dict[str, Any]] = None) -> Tuple[PostRecord, List[CommentRecord]]:
+        """
+        转换单个一级评论项目为入库记录
         
-        return classifier_dict
+        Args:
+            item: 一级评论项目
+            classifier_results: 分类结果字典 {comment_id: result}
+            
+        Returns:
+            (post记录, 该post下所有二级及更深层级评论记录列表)
+        """
+        # 转换为post（传入classifier结果）
+        post_record = self.convert_first_level_to_post(item, classifier_results)
+        
+        # 提取所有二级及更深层级的评论
+        comments = []
+        comments_tree = item.get('comments_tree', [])
+        if comments_tree:
+            first_level_comment = comments_tree[0]
+            post_source_platform_id = first_level_comment.get('id', '')
+            fetched_at = item.get('fetched_at', '')
+            
+            comments = self.extract_all_second_level_comments(
+                first_level_comment,
+                post_source_platform_id,
+                fetched_at
+            )
+        
+        return post_record, comments
     
     def prepare_task_data(self, task_id: str, use_classifier: bool = True) -> tuple:
         """
@@ -396,23 +488,9 @@ class DBDataPreparer:
         
         for i, item in enumerate(filtered_data, 1):
             try:
-                # 转换为post（传入classifier结果）
-                post_record = self.convert_first_level_to_post(item, classifier_results)
+                post_record, item_comments = self.prepare_item(item, classifier_results)
                 posts.append(post_record)
-                
-                # 提取所有二级及更深层级的评论
-                comments_tree = item.get('comments_tree', [])
-                if comments_tree:
-                    first_level_comment = comments_tree[0]
-                    post_source_platform_id = first_level_comment.get('id', '')
-                    fetched_at = item.get('fetched_at', '')
-                    
-                    second_level_comments = self.extract_all_second_level_comments(
-                        first_level_comment,
-                        post_source_platform_id,
-                        fetched_at
-                    )
-                    comments.extend(second_level_comments)
+                comments.extend(item_comments)
                 
                 if (i + 1) % 100 == 0:
                     print(f"  处理进度: {i + 1}/{len(filtered_data)}")
@@ -427,7 +505,26 @@ class DBDataPreparer:
         
         return posts, comments
     
-    def save_posts(self, task_id: str, posts: List[Dict[str, Any]]):
+    def _write_records(self, records: List[Any], filepath: str):
+        """
+        以紧凑JSON写出记录（供入库程序读取，不需要缩进）
+        
+        安装了orjson时直接编码为UTF-8字节写出，否则使用标准库紧凑分隔符
+        
+        Args:
+            records: 记录列表
+            filepath: 输出文件路径
+        """
+        if orjson is not None:
+            with open(filepath, 'wb') as f:
+                f.write(orjson.dumps(records, default=_record_to_dict,
+                                     option=orjson.OPT_PASSTHROUGH_DATACLASS))
+            return
+        
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, separators=(',', ':'), default=_record_to_dict)
+    
+    def save_posts(self, task_id: str, posts: List[PostRecord]):
         """
         保存posts数据
         
@@ -438,13 +535,12 @@ class DBDataPreparer:
         filename = f"{task_id}_posts.json"
         filepath = os.path.join(self.posts_dir, filename)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(posts, f, ensure_ascii=False, indent=2)
+        self._write_records(posts, filepath)
         
         print(f"\n✓ Posts数据已保存到: {filepath}")
         print(f"  共 {len(posts)} 条记录")
     
-    def save_comments(self, task_id: str, comments: List[Dict[str, Any]]):
+    def save_comments(self, task_id: str, comments: List[CommentRecord]):
         """
         保存comments数据
         
@@ -455,8 +551,7 @@ class DBDataPreparer:
         filename = f"{task_id}_comments.json"
         filepath = os.path.join(self.comments_dir, filename)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(comments, f, ensure_ascii=False, indent=2)
+        self._write_records(comments, filepath)
         
         print(f"\n✓ Comments数据已保存到: {filepath}")
         print(f"  共 {len(comments)} 条记录")
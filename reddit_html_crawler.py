@@ -7,31 +7,431 @@ Reddit HTML爬虫脚本
 """
 
 import os
+import re
+import sys
 import json
 import time
 import hashlib
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from urllib.parse import urljoin, urlparse, parse_qs, quote_plus
 import argparse
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock, Semaphore
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Reddit的图片/视频URL后缀
+_MEDIA_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp4', '.webm', '.gifv')
+
+_MEDIA_EXTENSIONS_BYTES = tuple(ext.encode('ascii') for ext in _MEDIA_EXTENSIONS)
+
+# 正文中的链接：从http://或https://开始，到空白（空格、换行、回车、制表符）或右括号类字符为止
+# 直接在UTF-8编码后的正文上匹配，与计算hash共用同一份字节
+_URL_RE = re.compile(rb'https?://[^ \n\r\t)\]}>]*')
+
+# 空正文的hash，直接返回常量，不必每次计算
+_EMPTY_CONTENT_HASH = hashlib.blake2b(b'', digest_size=16).hexdigest()
+
+# 未指定delay时令牌桶允许的最大突发请求数
+_BUCKET_BURST_CAPACITY = 10
+
+# 逐个项目写出JSON时使用的文件缓冲区大小（默认8KB时几乎每个项目都触发一次write系统调用）
+_WRITE_BUFFER_SIZE = 256 * 1024
+
+
+def _dumps_item(item: Dict[str, Any]) -> bytes:
+    """
+    将单个项目编码为紧凑的UTF-8 JSON字节（单行）：安装了orjson时直接编码，否则使用标准库紧凑分隔符
+    
+    字符串中的换行符都会被转义，因此编码结果中不含换行
+    """
+    if orjson is not None:
+        return orjson.dumps(item, default=_comment_to_dict, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'), default=_comment_to_dict).encode('utf-8')
+
+
+def _loads_response(response) -> Any:
+    """
+    解析响应体JSON：安装了orjson时直接解析原始字节，否则使用response.json()
+    
+    两种方式解析失败时都抛出json.JSONDecodeError（orjson.JSONDecodeError是其子类）
+    """
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+@lru_cache(maxsize=4096)
+def _format_timestamp(timestamp: float) -> str:
+    """
+    将Unix时间戳转换为本地时间的ISO格式字符串（结果缓存，同一秒内的评论/帖子直接复用）
+    
+    Args:
+        timestamp: Unix时间戳
+        
+    Returns:
+        ISO格式时间字符串
+    """
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def _parse_rate_limit_headers(headers) -> Tuple[Optional[int], Optional[int]]:
+    """
+    一次性解析Reddit限流响应头
+    
+    Args:
+        headers: 响应头
+        
+    Returns:
+        (X-Ratelimit-Remaining, X-Ratelimit-Reset)，缺失或不是整数时为None
+    """
+    remaining = headers.get('X-Ratelimit-Remaining')
+    reset = headers.get('X-Ratelimit-Reset')
+    try:
+        remaining = int(remaining) if remaining else None
+    except ValueError:
+        remaining = None
+    try:
+        reset = int(reset) if reset else None
+    except ValueError:
+        reset = None
+    return remaining, reset
+
+
+# Reddit JSON API支持的标准查询参数
+_JSON_API_PARAMS = frozenset(('q', 'restrict_sr', 'sort', 't', 'limit', 'after', 'before'))
+
+
+@lru_cache(maxsize=4096)
+def _build_json_url(url: str) -> Tuple[str, str]:
+    """
+    将Reddit页面URL转换为JSON API URL（结果缓存，重试和重复URL不再重复处理字符串）
+    
+    Args:
+        url: Reddit URL
+    
+    Returns:
+        (JSON API URL, 请求使用的Referer)
+    """
+    # 先处理URL，移除尾部斜杠
+    clean_url = url.rstrip('/')
+    
+    # 分离基础URL和参数
+    if '?' in clean_url:
+        base_url, params_str = clean_url.split('?', 1)
+    else:
+        base_url = clean_url
+        params_str = ''
+    
+    # 将old.reddit.com或reddit.com替换为www.reddit.com（JSON API使用www域名）
+    if 'old.reddit.com' in base_url:
+        base_url = base_url.replace('old.reddit.com', 'www.reddit.com')
+    elif 'reddit.com' in base_url and 'www.reddit.com' not in base_url:
+        base_url = base_url.replace('reddit.com', 'www.reddit.com')
+    
+    # 清理参数：移除Reddit前端使用的参数（如cId, iId等），只保留标准参数
+    if params_str:
+        param_dict = {}
+        for param in params_str.split('&'):
+            # 只保留Reddit JSON API支持的标准参数；值保持原样，不做解码再编码
+            key, sep, value = param.partition('=')
+            if sep and key in _JSON_API_PARAMS:
+                param_dict[key] = value
+        
+        if param_dict:
+            param_str = '&'.join(f"{k}={v}" for k, v in param_dict.items())
+            # .json应该在查询参数之前
+            json_url = f"{base_url}.json?{param_str}"
+        else:
+            json_url = base_url + '.json'
+    else:
+        json_url = base_url + '.json'
+    
+    return json_url, base_url.replace('www.reddit.com', 'old.reddit.com')
+
+
+@lru_cache(maxsize=1024)
+def _normalize_url(url: str) -> str:
+    """
+    标准化Reddit URL（结果缓存）
+    
+    Args:
+        url: 原始URL
+        
+    Returns:
+        标准化后的URL
+    """
+    # 移除尾部斜杠
+    url = url.rstrip('/')
+    
+    # 如果已经是old.reddit.com，直接返回
+    if 'old.reddit.com' in url:
+        return url
+    
+    # 转换为old.reddit.com格式（用于显示）
+    # 但JSON API会使用www.reddit.com
+    url = url.replace('www.reddit.com', 'old.reddit.com')
+    if 'old.reddit.com' not in url and 'reddit.com' in url:
+        url = url.replace('reddit.com', 'old.reddit.com')
+    
+    return url
+
+
+@lru_cache(maxsize=1024)
+def _build_search_url(query: str) -> str:
+    """
+    构建Reddit搜索URL（结果缓存）
+    
+    Args:
+        query: 搜索关键词
+        
+    Returns:
+        Reddit搜索URL
+    """
+    # URL编码查询字符串
+    encoded_query = quote_plus(query)
+    # 构建Reddit搜索URL（全站搜索）
+    return f"https://old.reddit.com/search/?q={encoded_query}&restrict_sr=0&sort=relevance&t=all"
+
+
+@dataclass(slots=True)
+class Comment:
+    """评论树节点（字段顺序即输出JSON的键顺序）"""
+    id: str = ''
+    author: str = '[deleted]'
+    body: str = ''
+    score: int = 0
+    created_utc: str = ''
+    is_submitter: bool = False
+    permalink: str = ''
+    author_profile: Optional[str] = None
+    depth: int = 0
+    replies: List['Comment'] = field(default_factory=list)
+    reply_count: Optional[int] = None  # 子评论总数（所有层级），解析时汇总；不输出到JSON
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（replies中的子评论由序列化时的default回调继续转换，不输出reply_count）"""
+        record = {name: getattr(self, name) for name in self.__slots__}
+        del record['reply_count']
+        return record
+
+
+@dataclass(slots=True)
+class Post:
+    """帖子（_format_post_to_standard生成的标准格式，外加爬取过程中使用的字段）"""
+    post_id: Optional[int] = None  # 将在保存时填充
+    platform: str = 'reddit'
+    source_url: str = ''
+    source_platform_id: str = ''
+    hash_content: str = ''
+    fetched_at: str = ''
+    title: str = ''
+    content_text: str = ''
+    lang: str = 'english'
+    media_urls: List[str] = field(default_factory=list)
+    author_name: str = '[deleted]'
+    author_handle: str = '[deleted]'
+    author_followers: Optional[int] = None  # Reddit没有粉丝量
+    author_profile: Optional[str] = None  # Reddit没有简介/认证信息
+    likes: int = 0
+    comments: int = 0
+    saves: Optional[int] = None  # Reddit没有收藏数
+    views: Optional[int] = None  # Reddit没有观看数量
+    comments_tree: List[Comment] = field(default_factory=list)  # 评论树（递归结构）
+    subreddit: str = ''
+    permalink: str = ''  # 帖子permalink，用于获取评论
+    query_seed: Optional[str] = None  # 来源搜索关键词
+
+
+def _comment_to_dict(obj: Any) -> Dict[str, Any]:
+    """JSON序列化时的default回调，将评论节点转换为字典"""
+    if isinstance(obj, Comment):
+        return obj.to_dict()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+
+def _normalize_keywords(keywords: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+    """
+    预处理关键词列表（去空白、转小写、去掉空关键词），每次爬取只需执行一次
+    
+    Args:
+        keywords: 原始关键词列表（*表示不过滤）
+        
+    Returns:
+        小写关键词元组；不需要过滤时返回None
+    """
+    if not keywords:
+        return None
+    
+    # 如果关键词列表包含*，表示不过滤
+    if '*' in keywords:
+        return None
+    
+    normalized = (keyword.strip().lower() for keyword in keywords)
+    return tuple(keyword for keyword in normalized if keyword)
+
+
+def _count_comments(comments_tree: List[Comment]) -> int:
+    """
+    计算评论树中的评论总数（包括所有层级的子评论，使用显式栈迭代）
+    
+    解析时已汇总reply_count的评论直接使用该值，不再遍历其子评论
+    
+    Args:
+        comments_tree: 评论树列表
+        
+    Returns:
+        评论总数
+    """
+    total = 0
+    stack = [comments_tree]
+    while stack:
+        tree = stack.pop()
+        total += len(tree)
+        for comment in tree:
+            if comment.reply_count is not None:
+                total += comment.reply_count
+            elif comment.replies:
+                stack.append(comment.replies)
+    return total
+
+
+class TokenBucket:
+    """令牌桶限流器（线程安全）：按固定速率补充令牌，允许不超过容量的突发请求"""
+    
+    __slots__ = ('capacity', 'tokens', 'rate', 'last', 'lock')
+    
+    def __init__(self, capacity: float, rate: float):
+        """
+        初始化令牌桶
+        
+        Args:
+            capacity: 桶容量（最大突发请求数）
+            rate: 每秒补充的令牌数
+        """
+        self.capacity = capacity
+        self.tokens = capacity
+        self.rate = rate
+        self.last = time.monotonic()
+        self.lock = Lock()
+    
+    def acquire(self, n: float = 1) -> float:
+        """
+        取出n个令牌
+        
+        令牌不足时同样预先扣除（令牌数可为负），并发的调用方按先后顺序排队等待
+        
+        Args:
+            n: 需要的令牌数
+            
+        Returns:
+            调用方需要等待的秒数（0表示可以立即请求）
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= n
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+
+class ListingPage:
+    """列表页中的帖子：遍历时才逐个格式化，提前停止遍历时剩余帖子不再处理"""
+    
+    __slots__ = ('posts_data', 'after', 'format_post')
+    
+    def __init__(self, posts_data: List[Dict[str, Any]], after: Optional[str], format_post):
+        """
+        初始化列表页
+        
+        Args:
+            posts_data: 帖子原始JSON数据列表
+            after: 翻页token
+            format_post: 将原始数据格式化为帖子（Post）的函数
+        """
+        self.posts_data = posts_data
+        self.after = after
+        self.format_post = format_post
+    
+    def __len__(self) -> int:
+        return len(self.posts_data)
+    
+    def __iter__(self) -> Iterator[Post]:
+        try:
+            for post_data in self.posts_data:
+                yield self.format_post(post_data)
+        except Exception as e:
+            print(f"  - 提取帖子列表失败: {e}")
+
 
 class RedditHTMLCrawler:
     """Reddit HTML爬虫类"""
     
+    # 进程内共享的Session及其创建锁
+    _shared_session = None
+    _session_lock = Lock()
+    
+    @classmethod
+    def _get_shared_session(cls) -> requests.Session:
+        """
+        获取所有爬虫实例共享的Session（首次调用时创建）
+        
+        Returns:
+            共享的requests.Session
+        """
+        with cls._session_lock:
+            if cls._shared_session is None:
+                session = requests.Session()
+                # 扩大连接池（默认每个host只保留10个连接），并发请求复用keep-alive连接，减少TLS握手；
+                # 502/503/504等网关错误由适配器按退避自动重试（遵循Retry-After），
+                # 429（需要轮换请求头、记录限流重置时间）以及超时/连接错误仍由_get_json_data处理
+                retry = Retry(
+                    total=3,
+                    connect=0,
+                    read=0,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=('GET',),
+                    backoff_factor=1,
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50, max_retries=retry)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                cls._shared_session = session
+            return cls._shared_session
+    
+    @classmethod
+    def close_shared_session(cls):
+        """关闭共享Session，释放连接池中的keep-alive连接（之后创建的实例会重新建立Session）"""
+        with cls._session_lock:
+            if cls._shared_session is not None:
+                cls._shared_session.close()
+                cls._shared_session = None
+    
     def __init__(self, user_agent: str = None, delay: float = 0.5):
         """
         初始化爬虫
         
         Args:
             user_agent: 用户代理字符串
-            delay: 请求之间的延迟（秒，默认0.5）
+            delay: 请求之间的最小间隔（秒，默认0.5），与Reddit限额共同决定令牌桶速率
         """
-        self.session = requests.Session()
+        # 所有爬虫实例共用同一个Session（连接池、TLS会话），请求头按实例在每次请求时传入
+        self.session = self._get_shared_session()
         # 改进User-Agent格式，符合Reddit建议
         self.user_agent = user_agent or "python:QuestFinderCrawler:v1.0.0 (by u/QuestFinder)"
         
@@ -99,8 +499,8 @@ class RedditHTMLCrawler:
             },
         ]
         
+        # 当前使用的请求头（Session为共享的，轮换只影响本实例）
         self.current_header_index = 0
-        self.session.headers.update(self.header_configs[self.current_header_index])
         
         self.delay = delay
         self.data_dir = "Data"
@@ -108,20 +508,34 @@ class RedditHTMLCrawler:
         self.mask_dir = os.path.join(self.data_dir, "mask")
         self._ensure_data_dir()
         self._post_counter = 0  # 用于生成自增ID
-        self.print_lock = Lock()  # 用于线程安全的打印
         self.rate_limit_reset_time = None  # 限流重置时间
         # 使用信号量限制并发请求数（Reddit限流：每分钟最多100次请求）
         # 设置最大并发请求数为3，降低并发度以避免限流
-        self.request_semaphore = Semaphore(3)
-        # 全局请求时间戳队列，用于控制请求频率
-        self.request_timestamps = []
-        self.request_timestamps_lock = Lock()  # 保护请求时间戳队列
-        # 最小请求间隔（秒），确保请求不会过于频繁
-        self.min_request_interval = delay  # 使用设置的delay值
+        self.max_concurrent_requests = 3
+        self.request_semaphore = Semaphore(self.max_concurrent_requests)
+        # 全局令牌桶：速率取Reddit文档的限额（每分钟100次请求）与delay对应速率中较小者；
+        # 列表页和评论请求都只按令牌桶放行，不再在每次请求后sleep。
+        # 指定了delay时容量为1，相邻请求之间至少间隔delay秒；否则只允许少量突发
+        bucket_rate = 100 / 60
+        bucket_capacity = _BUCKET_BURST_CAPACITY
+        if delay > 0:
+            bucket_rate = min(bucket_rate, 1 / delay)
+            bucket_capacity = 1
+        self.bucket = TokenBucket(capacity=bucket_capacity, rate=bucket_rate)
+    
+    def _log(self, message: str):
+        """
+        线程安全地打印一行：整行（含换行符）一次写入stdout，不会与其他线程的输出交错，
+        因此无需加锁（print会分两次写入正文和换行符）
+        
+        Args:
+            message: 要打印的内容
+        """
+        sys.stdout.write(f"{message}\n")
     
     def _calculate_content_hash(self, content: str) -> str:
         """
-        计算正文内容的hash
+        计算正文内容的hash（BLAKE2b，16字节摘要，与prepare_for_db.py一致）
         
         Args:
             content: 正文内容
@@ -130,75 +544,53 @@ class RedditHTMLCrawler:
             hash字符串
         """
         if not content:
-            return hashlib.md5(b'').hexdigest()
-        return hashlib.md5(content.encode('utf-8')).hexdigest()
+            return _EMPTY_CONTENT_HASH
+        # 每个评论项目都会调用，直接计算而不再经过 _calculate_content_hash_bytes 转一次调用
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _calculate_content_hash_bytes(self, content: bytes) -> str:
+        """
+        计算已编码正文的hash，结果与 _calculate_content_hash 相同
+        
+        Args:
+            content: UTF-8编码的正文内容
+            
+        Returns:
+            hash字符串
+        """
+        if not content:
+            return _EMPTY_CONTENT_HASH
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
     
-    def _extract_media_urls(self, url: str, selftext: str) -> List[str]:
+    def _extract_media_urls(self, url: str, selftext: bytes) -> List[str]:
         """
         提取媒体URL（图片/视频）
         
         Args:
             url: 帖子URL
-            selftext: 帖子正文
+            selftext: UTF-8编码的帖子正文
             
         Returns:
             媒体URL列表
         """
         media_urls = []
         
-        # Reddit的图片/视频URL模式
-        image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-        video_extensions = ['.mp4', '.webm', '.gifv']
-        
         # 检查url是否是媒体文件
-        url_lower = url.lower()
-        if any(url_lower.endswith(ext) for ext in image_extensions + video_extensions):
+        if url.lower().endswith(_MEDIA_EXTENSIONS):
             media_urls.append(url)
         
-        # 检查selftext中的链接（Reddit markdown格式）
-        # 简单的URL提取（不使用正则表达式）
-        urls_in_text = []
-        text = selftext
-        while 'http://' in text or 'https://' in text:
-            # 找到http://或https://的位置
-            http_pos = text.find('http://')
-            https_pos = text.find('https://')
-            
-            if http_pos == -1:
-                start_pos = https_pos
-            elif https_pos == -1:
-                start_pos = http_pos
-            else:
-                start_pos = min(http_pos, https_pos)
-            
-            # 从起始位置开始提取URL
-            url_start = start_pos
-            url_end = len(text)
-            
-            # 找到URL的结束位置（空格、换行、括号等）
-            for end_char in [' ', '\n', '\r', '\t', ')', ']', '}', '>']:
-                end_pos = text.find(end_char, url_start)
-                if end_pos != -1 and end_pos < url_end:
-                    url_end = end_pos
-            
-            found_url = text[url_start:url_end]
-            if found_url:
-                urls_in_text.append(found_url)
-            
-            # 继续查找下一个URL
-            text = text[url_end:]
-        
-        for found_url in urls_in_text:
-            found_url_lower = found_url.lower()
-            if any(found_url_lower.endswith(ext) for ext in image_extensions + video_extensions):
-                # 移除可能的markdown格式
-                clean_url = found_url.rstrip(')').rstrip(']')
-                if clean_url not in media_urls:
-                    media_urls.append(clean_url)
+        # 检查selftext中的链接（Reddit markdown格式），一次扫描取出所有URL
+        # URL在ASCII分隔符处截断，按UTF-8解码总是完整的；只解码需要保留的URL
+        seen = {url.encode('utf-8')} if media_urls else set()
+        for match in _URL_RE.finditer(selftext):
+            found_url = match.group()
+            if found_url not in seen and found_url.lower().endswith(_MEDIA_EXTENSIONS_BYTES):
+                seen.add(found_url)
+                media_urls.append(found_url.decode('utf-8'))
         
-        return media_urls if media_urls else []
+        return media_urls
     
-    def _format_post_to_standard(self, post_data: Dict[str, Any], source_url: str = "") -> Dict[str, Any]:
+    def _format_post_to_standard(self, post_data: Dict[str, Any], source_url: str = "") -> Post:
         """
         将Reddit post数据格式化为标准格式
         
@@ -207,21 +599,24 @@ class RedditHTMLCrawler:
             source_url: 来源URL
             
         Returns:
-            格式化后的post字典
+            格式化后的帖子
         """
         selftext = post_data.get('selftext', '')
         url = post_data.get('url', '')
         
+        # 正文只编码一次，hash和媒体URL扫描共用
+        selftext_bytes = selftext.encode('utf-8') if selftext else b''
+        
         # 计算hash
-        hash_content = self._calculate_content_hash(selftext)
+        hash_content = self._calculate_content_hash_bytes(selftext_bytes)
         
         # 提取媒体URL
-        media_urls = self._extract_media_urls(url, selftext)
+        media_urls = self._extract_media_urls(url, selftext_bytes)
         
         # 格式化时间
         created_utc = post_data.get('created_utc', 0)
         if created_utc:
-            fetched_at = datetime.fromtimestamp(created_utc).isoformat()
+            fetched_at = _format_timestamp(created_utc)
         else:
             fetched_at = datetime.now().isoformat()
         
@@ -235,66 +630,29 @@ class RedditHTMLCrawler:
         # 如果permalink存在，优先使用它；否则使用传入的source_url或post的url
         post_url = permalink or post_data.get('url', '') or source_url
         
-        formatted_post = {
-            "post_id": None,  # 将在保存时填充
-            "platform": "reddit",
-            "source_url": post_url,
-            "source_platform_id": post_data.get('id', ''),
-            "hash_content": hash_content,
-            "fetched_at": fetched_at,
-            "title": post_data.get('title', ''),
-            "content_text": selftext,
-            "lang": "english",
-            "media_urls": media_urls if media_urls else [],
-            "author_name": post_data.get('author', '[deleted]'),
-            "author_handle": post_data.get('author', '[deleted]'),
-            "author_followers": None,  # Reddit没有粉丝量
-            "author_profile": None,  # Reddit没有简介/认证信息
-            "likes": post_data.get('score', 0),
-            "comments": post_data.get('num_comments', 0),
-            "saves": None,  # Reddit没有收藏数
-            "views": None,  # Reddit没有观看数量
-            "comments_tree": []  # 评论树（递归结构）
-        }
-        
-        return formatted_post
+        author = post_data.get('author', '[deleted]')
+        return Post(
+            source_url=post_url,
+            source_platform_id=post_data.get('id', ''),
+            hash_content=hash_content,
+            fetched_at=fetched_at,
+            title=post_data.get('title', ''),
+            content_text=selftext,
+            media_urls=media_urls if media_urls else [],
+            author_name=author,
+            author_handle=author,
+            likes=post_data.get('score', 0),
+            comments=post_data.get('num_comments', 0),
+        )
     
     def _ensure_data_dir(self):
-        """确保Data目录及其子目录存在"""
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
-            print(f"已创建目录: {self.data_dir}")
-        if not os.path.exists(self.raw_dir):
-            os.makedirs(self.raw_dir)
-            print(f"已创建目录: {self.raw_dir}")
-        if not os.path.exists(self.mask_dir):
-            os.makedirs(self.mask_dir)
-            print(f"已创建目录: {self.mask_dir}")
-    
-    def _normalize_url(self, url: str) -> str:
-        """
-        标准化Reddit URL
-        
-        Args:
-            url: 原始URL
-            
-        Returns:
-            标准化后的URL
-        """
-        # 移除尾部斜杠
-        url = url.rstrip('/')
-        
-        # 如果已经是old.reddit.com，直接返回
-        if 'old.reddit.com' in url:
-            return url
-        
-        # 转换为old.reddit.com格式（用于显示）
-        # 但JSON API会使用www.reddit.com
-        url = url.replace('www.reddit.com', 'old.reddit.com')
-        if 'old.reddit.com' not in url and 'reddit.com' in url:
-            url = url.replace('reddit.com', 'old.reddit.com')
-        
-        return url
+        """确保Data目录及其子目录存在（直接创建，已存在时跳过，不再先单独检查）"""
+        for path in (self.data_dir, self.raw_dir, self.mask_dir):
+            try:
+                os.makedirs(path)
+            except FileExistsError:
+                continue
+            print(f"已创建目录: {path}")
     
     def _rotate_headers(self):
         """
@@ -304,9 +662,22 @@ class RedditHTMLCrawler:
             是否成功轮换（如果所有请求头都试过了，返回False）
         """
         self.current_header_index = (self.current_header_index + 1) % len(self.header_configs)
-        self.session.headers.update(self.header_configs[self.current_header_index])
         return True
     
+    def _request_headers(self, referer: str) -> Dict[str, str]:
+        """
+        构建单次请求的请求头：当前轮换到的请求头加上Referer
+        
+        Args:
+            referer: Referer头
+            
+        Returns:
+            请求头字典（覆盖requests的全部默认请求头）
+        """
+        headers = dict(self.header_configs[self.current_header_index])
+        headers['Referer'] = referer
+        return headers
+    
     def _get_json_data(self, url: str, max_retries: int = 3) -> Optional[Dict]:
         """
         尝试从Reddit的JSON API获取数据（带重试机制）
@@ -318,149 +689,73 @@ class RedditHTMLCrawler:
         Returns:
             JSON数据或None
         """
-        # 先处理URL，移除尾部斜杠
-        clean_url = url.rstrip('/')
-        
-        # 分离基础URL和参数
-        if '?' in clean_url:
-            base_url, params_str = clean_url.split('?', 1)
-        else:
-            base_url = clean_url
-            params_str = ''
-        
-        # 将old.reddit.com或reddit.com替换为www.reddit.com（JSON API使用www域名）
-        if 'old.reddit.com' in base_url:
-            base_url = base_url.replace('old.reddit.com', 'www.reddit.com')
-        elif 'reddit.com' in base_url and 'www.reddit.com' not in base_url:
-            base_url = base_url.replace('reddit.com', 'www.reddit.com')
-        
-        # 清理参数：移除Reddit前端使用的参数（如cId, iId等），只保留标准参数
-        if params_str:
-            param_dict = {}
-            for param in params_str.split('&'):
-                if '=' in param:
-                    key, value = param.split('=', 1)
-                    # 只保留Reddit JSON API支持的标准参数
-                    if key in ['q', 'restrict_sr', 'sort', 't', 'limit', 'after', 'before']:
-                        param_dict[key] = value
-            
-            if param_dict:
-                param_str = '&'.join([f"{k}={v}" for k, v in param_dict.items()])
-                # .json应该在查询参数之前
-                json_url = f"{base_url}.json?{param_str}"
-            else:
-                json_url = base_url + '.json'
-        else:
-            json_url = base_url + '.json'
-        
-        # 为JSON API请求添加Referer头
-        headers = {
-            'Referer': base_url.replace('www.reddit.com', 'old.reddit.com'),
-        }
+        json_url, referer = _build_json_url(url)
         
         # 检查是否需要等待限流重置
         if self.rate_limit_reset_time and time.time() < self.rate_limit_reset_time:
             wait_time = int(self.rate_limit_reset_time - time.time()) + 1
             if wait_time > 0:
-                with self.print_lock:
-                    print(f"  - 等待限流重置，还需等待 {wait_time} 秒...")
+                self._log(f"  - 等待限流重置，还需等待 {wait_time} 秒...")
                 time.sleep(wait_time)
         
         # 使用信号量限制并发请求数
         with self.request_semaphore:
-            # 智能延迟控制：确保请求间隔足够
-            with self.request_timestamps_lock:
-                current_time = time.time()
-                # 清理超过1分钟的旧时间戳
-                self.request_timestamps = [t for t in self.request_timestamps if current_time - t < 60]
-                
-                # 如果最近有请求，计算需要等待的时间
-                if self.request_timestamps:
-                    last_request_time = max(self.request_timestamps)
-                    time_since_last = current_time - last_request_time
-                    if time_since_last < self.min_request_interval:
-                        wait_time = self.min_request_interval - time_since_last
-                        if wait_time > 0:
-                            time.sleep(wait_time)
-                            current_time = time.time()
-                
-                # 记录本次请求时间
-                self.request_timestamps.append(current_time)
+            # 从令牌桶取令牌，令牌不足时等待补充
+            wait_time = self.bucket.acquire(1)
+            if wait_time:
+                time.sleep(wait_time)
             
             # 重试机制
             for attempt in range(max_retries):
                 try:
-                    response = self.session.get(json_url, timeout=30, verify=True, headers=headers)
+                    response = self.session.get(json_url, timeout=30, verify=True, headers=self._request_headers(referer))
                     
                     # 监控限流响应头（即使成功也要检查）
-                    rate_limit_remaining = response.headers.get('X-Ratelimit-Remaining')
-                    rate_limit_used = response.headers.get('X-Ratelimit-Used')
-                    rate_limit_reset = response.headers.get('X-Ratelimit-Reset')
+                    remaining, reset_time = _parse_rate_limit_headers(response.headers)
                     
-                    if rate_limit_remaining:
-                        try:
-                            remaining = int(rate_limit_remaining)
-                            # 如果剩余请求数很少，主动增加延迟
-                            if remaining < 10:
-                                extra_delay = (10 - remaining) * 0.5
-                                with self.print_lock:
-                                    print(f"  - 限流警告: 剩余 {remaining} 次请求，增加延迟 {extra_delay:.1f} 秒")
-                                time.sleep(extra_delay)
-                        except ValueError:
-                            pass
+                    # 如果剩余请求数很少，主动增加延迟
+                    if remaining is not None and remaining < 10:
+                        extra_delay = (10 - remaining) * 0.5
+                        self._log(f"  - 限流警告: 剩余 {remaining} 次请求，增加延迟 {extra_delay:.1f} 秒")
+                        time.sleep(extra_delay)
                     
-                    if rate_limit_reset:
-                        try:
-                            # X-Ratelimit-Reset是Unix时间戳
-                            reset_time = int(rate_limit_reset)
-                            self.rate_limit_reset_time = reset_time
-                        except ValueError:
-                            pass
+                    # X-Ratelimit-Reset是Unix时间戳
+                    if reset_time is not None:
+                        self.rate_limit_reset_time = reset_time
                     
                     # 处理429限流错误
                     if response.status_code == 429:
                         # 先尝试更换请求头（如果还没试过所有请求头）
                         if attempt == 0 and len(self.header_configs) > 1:
-                            with self.print_lock:
-                                print(f"  - 429限流错误，尝试更换请求头...")
+                            self._log(f"  - 429限流错误，尝试更换请求头...")
                             self._rotate_headers()
                             
                             # 立即用新请求头重试一次（不等待）
                             try:
-                                retry_response = self.session.get(json_url, timeout=30, verify=True, headers={
-                                    'Referer': base_url.replace('www.reddit.com', 'old.reddit.com'),
-                                })
+                                retry_response = self.session.get(json_url, timeout=30, verify=True,
+                                                                  headers=self._request_headers(referer))
                                 
                                 # 如果更换请求头后成功，直接返回
                                 if retry_response.status_code == 200:
-                                    with self.print_lock:
-                                        print(f"  - ✓ 更换请求头后成功，继续使用新请求头")
+                                    self._log(f"  - ✓ 更换请求头后成功，继续使用新请求头")
                                     
                                     # 更新限流信息
-                                    retry_rate_limit_remaining = retry_response.headers.get('X-Ratelimit-Remaining')
-                                    retry_rate_limit_reset = retry_response.headers.get('X-Ratelimit-Reset')
-                                    if retry_rate_limit_reset:
-                                        try:
-                                            reset_time = int(retry_rate_limit_reset)
-                                            self.rate_limit_reset_time = reset_time
-                                        except ValueError:
-                                            pass
+                                    _, retry_reset_time = _parse_rate_limit_headers(retry_response.headers)
+                                    if retry_reset_time is not None:
+                                        self.rate_limit_reset_time = retry_reset_time
                                     
                                     # 解析JSON
                                     try:
-                                        return retry_response.json()
+                                        return _loads_response(retry_response)
                                     except json.JSONDecodeError:
-                                        with self.print_lock:
-                                            print(f"  - JSON解析失败: {json_url}")
+                                        self._log(f"  - JSON解析失败: {json_url}")
                                         return None
                                 
                                 # 如果更换请求头后仍然是429，继续使用等待逻辑
                                 if retry_response.status_code == 429:
-                                    with self.print_lock:
-                                        print(f"  - ⚠️  更换请求头后仍然限流，进入等待逻辑...")
+                                    self._log(f"  - ⚠️  更换请求头后仍然限流，进入等待逻辑...")
                             except Exception as e:
-                                with self.print_lock:
-                                    print(f"  - ⚠️  更换请求头后重试失败: {e}，进入等待逻辑...")
+                                self._log(f"  - ⚠️  更换请求头后重试失败: {e}，进入等待逻辑...")
                         
                         # 等待逻辑（如果更换请求头无效或已经试过）
                         # 优先使用Retry-After头
@@ -474,13 +769,8 @@ class RedditHTMLCrawler:
                             wait_time = None
                         
                         # 如果没有Retry-After，使用X-Ratelimit-Reset计算等待时间
-                        if not wait_time and rate_limit_reset:
-                            try:
-                                reset_time = int(rate_limit_reset)
-                                current_time = int(time.time())
-                                wait_time = max(reset_time - current_time, 60)  # 至少等待60秒
-                            except ValueError:
-                                wait_time = None
+                        if not wait_time and reset_time is not None:
+                            wait_time = max(reset_time - int(time.time()), 60)  # 至少等待60秒
                         
                         # 如果都没有，使用更长的指数退避（Reddit限流通常需要等待更长时间）
                         if not wait_time:
@@ -488,27 +778,24 @@ class RedditHTMLCrawler:
                             wait_time = 60 * (2 ** attempt)
                         
                         if attempt < max_retries - 1:
-                            with self.print_lock:
-                                print(f"  - 429限流错误，等待 {wait_time} 秒后重试 (尝试 {attempt + 1}/{max_retries})...")
-                                if rate_limit_remaining:
-                                    print(f"  - 限流状态: 剩余 {rate_limit_remaining} 次请求")
-                                if rate_limit_reset:
-                                    reset_seconds = int(rate_limit_reset) - int(time.time())
-                                    print(f"  - 限流将在 {reset_seconds} 秒后重置")
+                            self._log(f"  - 429限流错误，等待 {wait_time} 秒后重试 (尝试 {attempt + 1}/{max_retries})...")
+                            if remaining is not None:
+                                self._log(f"  - 限流状态: 剩余 {remaining} 次请求")
+                            if reset_time is not None:
+                                reset_seconds = reset_time - int(time.time())
+                                self._log(f"  - 限流将在 {reset_seconds} 秒后重置")
                             time.sleep(wait_time)
                             continue
                         else:
-                            with self.print_lock:
-                                print(f"  - 429限流错误，已达到最大重试次数")
-                                print(f"  - 建议: 增加 --delay 参数值（当前: {self.delay}秒）或等待更长时间")
+                            self._log(f"  - 429限流错误，已达到最大重试次数")
+                            self._log(f"  - 建议: 增加 --delay 参数值（当前: {self.delay}秒）或等待更长时间")
                             return None
                     
                     # 处理403错误
                     if response.status_code == 403:
-                        with self.print_lock:
-                            print(f"  - 403错误: Reddit可能阻止了请求")
-                            print(f"  - 尝试访问的URL: {json_url}")
-                            print(f"  - 提示: 可能需要增加延迟时间或使用VPN")
+                        self._log(f"  - 403错误: Reddit可能阻止了请求")
+                        self._log(f"  - 尝试访问的URL: {json_url}")
+                        self._log(f"  - 提示: 可能需要增加延迟时间或使用VPN")
                         return None
                     
                     response.raise_for_status()
@@ -516,27 +803,14 @@ class RedditHTMLCrawler:
                     # 检查响应内容类型
                     content_type = response.headers.get('Content-Type', '')
                     if 'application/json' not in content_type:
-                        with self.print_lock:
-                            print(f"  - 警告: 响应不是JSON格式，Content-Type: {content_type}")
-                            print(f"  - 尝试访问的URL: {json_url}")
-                    
-                    data = response.json()
+                        self._log(f"  - 警告: 响应不是JSON格式，Content-Type: {content_type}")
+                        self._log(f"  - 尝试访问的URL: {json_url}")
                     
-                    # 根据限流状态动态调整延迟
-                    if rate_limit_remaining:
-                        try:
-                            remaining = int(rate_limit_remaining)
-                            # 如果剩余请求数很少，增加延迟
-                            if remaining < 20:
-                                adjusted_delay = self.delay * (1 + (20 - remaining) * 0.1)
-                            else:
-                                adjusted_delay = self.delay
-                        except ValueError:
-                            adjusted_delay = self.delay
-                    else:
-                        adjusted_delay = self.delay
+                    data = _loads_response(response)
                     
-                    time.sleep(adjusted_delay)
+                    # 剩余请求数很少时，在令牌桶的基础上额外放慢（正常情况下不再等待）
+                    if remaining is not None and remaining < 20:
+                        time.sleep(self.delay * (20 - remaining) * 0.1)
                     return data
                 
                 except requests.exceptions.Timeout:
@@ -571,7 +845,7 @@ class RedditHTMLCrawler:
         
         return None
     
-    def _parse_post_from_json(self, post_data: Dict) -> Optional[Dict[str, Any]]:
+    def _parse_post_from_json(self, post_data: Dict) -> Optional[Post]:
         """
         从JSON数据解析帖子信息
         
@@ -579,7 +853,7 @@ class RedditHTMLCrawler:
             post_data: Reddit JSON数据
             
         Returns:
-            帖子字典
+            帖子
         """
         try:
             if 'data' not in post_data:
@@ -596,70 +870,88 @@ class RedditHTMLCrawler:
             if permalink and not permalink.startswith('http'):
                 permalink = f"https://reddit.com{permalink}"
             
-            post_dict = self._format_post_to_standard(post, source_url=permalink)
+            parsed_post = self._format_post_to_standard(post, source_url=permalink)
             # 保留一些额外信息（如果需要）
-            post_dict['subreddit'] = post.get('subreddit', '')
+            parsed_post.subreddit = post.get('subreddit', '')
             # 保存permalink用于获取评论
-            post_dict['_permalink'] = permalink
+            parsed_post.permalink = permalink
             
-            return post_dict
+            return parsed_post
         except Exception as e:
             print(f"  - 解析帖子JSON失败: {e}")
             return None
     
-    def _parse_comment_from_json(self, comment_data: Dict, depth: int = 0) -> Optional[Dict[str, Any]]:
+    def _parse_comments_from_json(self, children: List[Dict], depth: int = 0) -> List[Comment]:
         """
-        从JSON数据递归解析评论
+        从JSON数据解析评论树（使用显式栈迭代，避免深层回复链的递归开销和递归深度限制）
         
         Args:
-            comment_data: 评论JSON数据
-            depth: 当前深度
+            children: 评论JSON数据列表
+            depth: 这一层评论的深度
             
         Returns:
-            评论字典
+            评论节点列表
         """
-        try:
-            if comment_data.get('kind') != 't1':  # t1是评论类型
-                return None
-            
-            data = comment_data.get('data', {})
-            
-            # 跳过被删除的评论
-            if data.get('body') == '[deleted]' and not data.get('replies'):
-                return None
-            
-            # 构建author个人主页URL
-            author = data.get('author', '[deleted]')
-            author_profile_url = None
-            if author and author != '[deleted]':
-                author_profile_url = f"https://reddit.com/user/{author}"
-            
-            comment_dict = {
-                "id": data.get('id', ''),
-                "author": author,
-                "body": data.get('body', ''),
-                "score": data.get('score', 0),
-                "created_utc": datetime.fromtimestamp(data.get('created_utc', 0)).isoformat() if data.get('created_utc') else '',
-                "is_submitter": data.get('is_submitter', False),
-                "permalink": f"https://reddit.com{data.get('permalink', '')}",
-                "author_profile": author_profile_url,  # 添加author个人主页URL
-                "depth": depth,
-                "replies": []
-            }
-            
-            # 递归处理回复
-            replies = data.get('replies', {})
-            if replies and isinstance(replies, dict) and 'data' in replies:
-                for child in replies['data'].get('children', []):
-                    reply = self._parse_comment_from_json(child, depth + 1)
-                    if reply:
-                        comment_dict["replies"].append(reply)
+        comments = []
+        # 栈中保存(所属列表, 评论JSON数据, 深度)，逆序入栈以保持同级评论的原有顺序
+        stack = [(comments, child, depth) for child in reversed(list(children))]
+        
+        while stack:
+            siblings, comment_data, depth = stack.pop()
+            if siblings is None:
+                # 子评论已全部处理完毕，汇总该评论的子评论总数（comment_data此时是评论节点）
+                comment_data.reply_count = sum(1 + reply.reply_count for reply in comment_data.replies)
+                continue
+            try:
+                if comment_data.get('kind') != 't1':  # t1是评论类型
+                    continue
+                
+                data = comment_data.get('data', {})
+                
+                # 跳过被删除的评论
+                if data.get('body') == '[deleted]' and not data.get('replies'):
+                    continue
+                
+                # 构建author个人主页URL
+                author = data.get('author', '[deleted]')
+                author_profile_url = None
+                if author and author != '[deleted]':
+                    author_profile_url = f"https://reddit.com/user/{author}"
+                
+                created_utc = data.get('created_utc')
+                comment = Comment(
+                    id=data.get('id', ''),
+                    author=author,
+                    body=data.get('body', ''),
+                    score=data.get('score', 0),
+                    created_utc=_format_timestamp(created_utc) if created_utc else '',
+                    is_submitter=data.get('is_submitter', False),
+                    permalink=f"https://reddit.com{data.get('permalink', '')}",
+                    author_profile=author_profile_url,  # 添加author个人主页URL
+                    depth=depth,
+                )
+                
+                # 回复列表无法读取时整条评论视为解析失败
+                replies = data.get('replies', {})
+                if replies and isinstance(replies, dict) and 'data' in replies:
+                    reply_children = list(replies['data'].get('children', []))
+                else:
+                    reply_children = []
+            except Exception:
+                continue
             
-            return comment_dict
-        except Exception as e:
-            return None
+            siblings.append(comment)
+            if not reply_children:
+                comment.reply_count = 0
+                continue
+            # 汇总标记先入栈，在所有子评论处理完之后才会出栈
+            stack.append((None, comment, depth))
+            for child in reversed(reply_children):
+                stack.append((comment.replies, child, depth + 1))
+        
+        return comments
     
-    def _extract_posts_from_listing_json(self, listing_data: Dict) -> Tuple[List[Dict], Optional[str]]:
+    def _extract_posts_from_listing_json(self, listing_data: Dict) -> 'ListingPage':
         """
         从列表页JSON数据提取帖子列表和翻页token
         
@@ -667,13 +959,13 @@ class RedditHTMLCrawler:
             listing_data: Reddit列表页JSON数据
             
         Returns:
-            (帖子数据列表, after_token用于翻页)
+            ListingPage（遍历时才逐个格式化帖子，after为翻页token）
         """
-        posts = []
+        posts_data = []
         after_token = None
         try:
             if 'data' not in listing_data:
-                return posts, after_token
+                return ListingPage(posts_data, after_token, self._format_listing_post)
             
             data = listing_data['data']
             
@@ -682,24 +974,51 @@ class RedditHTMLCrawler:
             
             for child in data.get('children', []):
                 if child.get('kind') == 't3':  # t3是帖子类型
-                    post_data = child.get('data', {})
-                    # 处理permalink
-                    permalink = post_data.get('permalink', '')
-                    if permalink and not permalink.startswith('http'):
-                        permalink = f"https://reddit.com{permalink}"
-                    # 使用标准格式
-                    post_dict = self._format_post_to_standard(post_data, source_url=permalink)
-                    # 保留一些额外信息（如果需要）
-                    post_dict['subreddit'] = post_data.get('subreddit', '')
-                    # 保存permalink用于获取评论
-                    post_dict['_permalink'] = permalink
-                    posts.append(post_dict)
+                    posts_data.append(child.get('data', {}))
         except Exception as e:
             print(f"  - 提取帖子列表失败: {e}")
         
-        return posts, after_token
+        return ListingPage(posts_data, after_token, self._format_listing_post)
+    
+    def _listing_from_json(self, json_data: Any) -> Optional[ListingPage]:
+        """
+        从列表页接口返回的JSON中取出Listing并提取帖子
+        
+        Args:
+            json_data: 接口返回的JSON（Listing对象，或以Listing开头的列表）
+            
+        Returns:
+            列表页帖子；不是Listing时返回None
+        """
+        # JSON解析结果只会是内置类型，直接比较type即可
+        listing = json_data[0] if type(json_data) is list and json_data else json_data
+        if type(listing) is dict and listing.get('kind') == 'Listing':
+            return self._extract_posts_from_listing_json(listing)
+        return None
+    
+    def _format_listing_post(self, post_data: Dict[str, Any]) -> Post:
+        """
+        格式化列表页中的单个帖子
+        
+        Args:
+            post_data: Reddit原始post数据
+            
+        Returns:
+            格式化后的帖子
+        """
+        # 处理permalink
+        permalink = post_data.get('permalink', '')
+        if permalink and not permalink.startswith('http'):
+            permalink = f"https://reddit.com{permalink}"
+        # 使用标准格式
+        post = self._format_post_to_standard(post_data, source_url=permalink)
+        # 保留一些额外信息（如果需要）
+        post.subreddit = post_data.get('subreddit', '')
+        # 保存permalink用于获取评论
+        post.permalink = permalink
+        return post
     
-    def _crawl_post_comments(self, post_url: str) -> List[Dict[str, Any]]:
+    def _crawl_post_comments(self, post_url: str) -> List[Comment]:
         """
         爬取单个帖子的所有评论
         
@@ -720,77 +1039,72 @@ class RedditHTMLCrawler:
             if 'data' not in comments_data:
                 return comments
             
-            for child in comments_data['data'].get('children', []):
-                comment = self._parse_comment_from_json(child)
-                if comment:
-                    comments.append(comment)
+            comments = self._parse_comments_from_json(comments_data['data'].get('children', []))
         
         except Exception as e:
             print(f"  - 爬取评论失败: {e}")
         
         return comments
     
-    def _filter_by_keywords(self, title: str, keywords: List[str]) -> bool:
+    def _filter_by_keywords(self, title: str, keywords: Optional[Tuple[str, ...]]) -> bool:
         """
         检查标题是否包含关键词（简单字符串匹配）
         
         Args:
             title: 帖子标题
-            keywords: 关键词列表（*表示不过滤）
+            keywords: 由 _normalize_keywords 预处理过的小写关键词（None表示不过滤）
             
         Returns:
             是否匹配
         """
-        if not keywords:
-            return True
-        
-        # 如果关键词列表包含*，表示不过滤，返回True
-        if '*' in keywords:
+        if keywords is None:
             return True
         
         title_lower = title.lower()
         
         # 简单的字符串匹配
         for keyword in keywords:
-            keyword = keyword.strip().lower()
-            if not keyword:
-                continue
-            
             if keyword in title_lower:
                 return True
         
         return False
     
-    def _build_search_url(self, query: str) -> str:
+    def _is_single_post_url(self, url: str) -> bool:
         """
-        构建Reddit搜索URL
+        判断URL是否是单个帖子URL
         
         Args:
-            query: 搜索关键词
+            url: Reddit URL
             
         Returns:
-            Reddit搜索URL
+            是否是单个帖子
         """
-        # URL编码查询字符串
-        encoded_query = quote_plus(query)
-        # 构建Reddit搜索URL（全站搜索）
-        search_url = f"https://old.reddit.com/search/?q={encoded_query}&restrict_sr=0&sort=relevance&t=all"
-        return search_url
+        # 单个帖子URL通常包含 /comments/（恰好一次；从第一次出现的末尾继续查找，与str.count一样不计重叠）
+        index = url.find('/comments/')
+        return index != -1 and url.find('/comments/', index + len('/comments/')) == -1
     
-    def _is_single_post_url(self, url: str) -> bool:
+    def _build_page_url(self, current_url: str, after_token: Optional[str]) -> str:
         """
-        判断URL是否是单个帖子URL
+        构建列表页的翻页URL
         
         Args:
-            url: Reddit URL
+            current_url: 列表页URL
+            after_token: 翻页token（第一页为None）
             
         Returns:
-            是否是单个帖子
+            带翻页参数的URL
         """
-        # 单个帖子URL通常包含 /comments/
-        return '/comments/' in url and url.count('/comments/') == 1
+        if after_token:
+            # 添加after参数用于翻页
+            if '?' in current_url:
+                return f"{current_url}&after={after_token}&limit=100"
+            return f"{current_url}?after={after_token}&limit=100"
+        # 第一页，添加limit参数
+        if '?' in current_url:
+            return f"{current_url}&limit=100"
+        return f"{current_url}?limit=100"
     
-    def _fetch_post_comments_worker(self, post: Dict[str, Any], permalink: str) -> List[Dict[str, Any]]:
+    def _fetch_post_comments_worker(self, post: Post, permalink: str) -> List[Comment]:
         """
         工作线程：获取单个帖子的评论
         
@@ -802,19 +1116,17 @@ class RedditHTMLCrawler:
             评论列表
         """
         if not permalink:
-            with self.print_lock:
-                print(f"  - 跳过（无permalink）: {post.get('title', '')[:30]}...")
+            self._log(f"  - 跳过（无permalink）: {post.title[:30]}...")
             return []
         
         try:
             comments = self._crawl_post_comments(permalink)
             return comments
         except Exception as e:
-            with self.print_lock:
-                print(f"  - 获取评论失败 ({post.get('title', '')[:30]}...): {e}")
+            self._log(f"  - 获取评论失败 ({post.title[:30]}...): {e}")
             return []
     
-    def crawl_url(self, url: str, keywords: List[str] = None, fetch_comments: bool = True, max_posts: int = None, max_first_level_comments: int = None, num_threads: int = 16, query_seed: str = None) -> List[Dict[str, Any]]:
+    def crawl_url(self, url: str, keywords: List[str] = None, fetch_comments: bool = True, max_posts: int = None, max_first_level_comments: int = None, num_threads: int = 16, query_seed: str = None) -> List[Post]:
         """
         爬取指定URL的帖子（支持翻页和多线程）
         
@@ -824,15 +1136,21 @@ class RedditHTMLCrawler:
             fetch_comments: 是否获取评论（列表页中的帖子需要单独访问）
             max_posts: 最大爬取帖子数量（已废弃，保留兼容性）
             max_first_level_comments: 最大一级评论数量（优先使用）
-            num_threads: 并发线程数（默认16，用于并行获取评论）
+            num_threads: 并发线程数上限（默认16，用于并行获取评论；实际不超过最大并发请求数）
             query_seed: 查询种子（用于标记来源）
             
         Returns:
             帖子数据列表
         """
         results = []
-        normalized_url = self._normalize_url(url)
+        normalized_url = _normalize_url(url)
+        # 关键词在整个爬取过程中不变，只预处理一次
+        keywords_lc = _normalize_keywords(keywords)
         is_single_post = self._is_single_post_url(normalized_url)
+        # 同时在途的请求数受信号量限制，多出的线程只会阻塞等待，因此线程池不超过该上限
+        comment_workers = max(1, min(num_threads, self.max_concurrent_requests))
+        page_executor = None
+        comment_executor = None
         
         print(f"\n正在爬取: {normalized_url}")
         if is_single_post:
@@ -851,18 +1169,16 @@ class RedditHTMLCrawler:
                 if json_data:
                     post = self._parse_post_from_json(json_data[0])
                     if post:
-                        if self._filter_by_keywords(post['title'], keywords or []):
+                        if self._filter_by_keywords(post.title, keywords_lc):
                             if fetch_comments:
                                 # 单个帖子也可以使用多线程（虽然只有一个，但保持一致性）
-                                permalink = post.get('_permalink', post.get('source_url', normalized_url))
+                                permalink = post.permalink
                                 if permalink:
-                                    post['comments_tree'] = self._crawl_post_comments(permalink)
+                                    post.comments_tree = self._crawl_post_comments(permalink)
                                 else:
-                                    post['comments_tree'] = []
+                                    post.comments_tree = []
                             else:
-                                post['comments_tree'] = []
-                            # 清理临时字段
-                            post.pop('_permalink', None)
+                                post.comments_tree = []
                             results.append(post)
                 return results
             
@@ -871,56 +1187,47 @@ class RedditHTMLCrawler:
             after_token = None
             page_num = 0
             total_crawled = 0
+            # results中的一级评论总数（随results增长累加，不再反复遍历results求和）
+            first_level_count = 0
+            # 处理本页评论的同时提前请求下一页（单线程，请求仍受信号量和令牌桶限制）
+            page_executor = ThreadPoolExecutor(max_workers=1)
+            prefetched_page = None
+            # 所有页、所有批次的评论获取共用一个线程池，不再每批重新创建线程
+            comment_executor = ThreadPoolExecutor(max_workers=comment_workers)
             
             while True:
                 page_num += 1
                 print(f"\n  - 第 {page_num} 页...")
                 
                 # 构建带翻页参数的URL
-                if after_token:
-                    # 添加after参数用于翻页
-                    if '?' in current_url:
-                        page_url = f"{current_url}&after={after_token}&limit=100"
-                    else:
-                        page_url = f"{current_url}?after={after_token}&limit=100"
-                else:
-                    # 第一页，添加limit参数
-                    if '?' in current_url:
-                        page_url = f"{current_url}&limit=100"
-                    else:
-                        page_url = f"{current_url}?limit=100"
+                page_url = self._build_page_url(current_url, after_token)
                 
-                # 获取JSON数据
-                json_data = self._get_json_data(page_url)
+                # 获取JSON数据（已提前请求的直接等待结果）
+                if prefetched_page is not None and prefetched_page[0] == page_url:
+                    json_data = prefetched_page[1].result()
+                else:
+                    json_data = self._get_json_data(page_url)
+                prefetched_page = None
                 
                 if not json_data:
                     print("  - 无法获取JSON数据，停止翻页")
                     break
                 
                 # 提取帖子列表和after token
-                posts = []
-                if isinstance(json_data, list) and len(json_data) > 0:
-                    if json_data[0].get('kind') == 'Listing':
-                        posts, after_token = self._extract_posts_from_listing_json(json_data[0])
-                elif isinstance(json_data, dict):
-                    if json_data.get('kind') == 'Listing':
-                        posts, after_token = self._extract_posts_from_listing_json(json_data)
-                
+                posts = self._listing_from_json(json_data)
                 if not posts:
                     print("  - 本页没有更多帖子，停止翻页")
                     break
+                after_token = posts.after
                 
                 print(f"  - 本页提取了 {len(posts)} 个帖子")
                 
                 # 处理本页的帖子（先过滤和准备）
                 posts_to_process = []
                 for i, post in enumerate(posts):
-                    # 计算当前已爬取的一级评论数
-                    current_first_level_count = sum(len(p.get('comments_tree', [])) for p in results)
-                    
                     # 检查是否达到一级评论数限制（优先检查）
-                    if max_first_level_comments and current_first_level_count >= max_first_level_comments:
-                        print(f"  - 已达到目标一级评论数 {max_first_level_comments}（当前: {current_first_level_count}），停止爬取")
+                    if max_first_level_comments and first_level_count >= max_first_level_comments:
+                        print(f"  - 已达到目标一级评论数 {max_first_level_comments}（当前: {first_level_count}），停止爬取")
                         break
                     
                     # 兼容性检查：如果使用旧的max_posts参数
@@ -928,12 +1235,11 @@ class RedditHTMLCrawler:
                         print(f"  - 已达到最大爬取数量 {max_posts}，停止爬取")
                         break
                     
-                    post['source_url'] = normalized_url
-                    post['_index'] = len(results) + len(posts_to_process)  # 用于排序
-                    post['_query_seed'] = query_seed  # 记录query_seed
+                    post.source_url = normalized_url
+                    post.query_seed = query_seed  # 记录query_seed
                     
                     # 关键词过滤
-                    if not self._filter_by_keywords(post['title'], keywords or []):
+                    if not self._filter_by_keywords(post.title, keywords_lc):
                         continue
                     
                     posts_to_process.append(post)
@@ -941,44 +1247,110 @@ class RedditHTMLCrawler:
                 
                 # 如果有一级评论数限制，在获取评论前先检查是否还需要
                 if max_first_level_comments:
-                    current_first_level_count = sum(len(p.get('comments_tree', [])) for p in results)
-                    remaining_needed = max_first_level_comments - current_first_level_count
+                    remaining_needed = max_first_level_comments - first_level_count
                     if remaining_needed <= 0:
                         print(f"  - 已达到目标一级评论数 {max_first_level_comments}，跳过本页所有帖子")
                         break
                 
+                # 提前请求下一页，与本页的评论获取重叠进行；
+                # 本页帖子的评论数（包含子评论，是一级评论数的上限）已够达到目标时，多半用不到下一页，
+                # 不提前请求以免浪费列表页请求配额（确实需要时翻页时再正常请求）
+                prefetch_next = bool(after_token)
+                if prefetch_next and max_first_level_comments and fetch_comments:
+                    prefetch_next = sum(post.comments for post in posts_to_process) < remaining_needed
+                elif prefetch_next and max_posts and not max_first_level_comments:
+                    prefetch_next = len(results) + len(posts_to_process) < max_posts
+                if prefetch_next:
+                    next_page_url = self._build_page_url(current_url, after_token)
+                    prefetched_page = (next_page_url, page_executor.submit(self._get_json_data, next_page_url))
+                
                 # 如果需要获取评论，使用多线程并行获取
                 if fetch_comments and posts_to_process:
-                    posts_with_comments = [p for p in posts_to_process if p.get('comments', 0) > 0]
-                    posts_without_comments = [p for p in posts_to_process if p.get('comments', 0) == 0]
-                    
-                    # 为没有评论的帖子设置空评论树
-                    for post in posts_without_comments:
-                        post['comments_tree'] = []
-                    
-                    # 如果有一级评论数限制，只获取需要的帖子数量（估算）
-                    # 假设每个帖子平均有5个一级评论，那么需要获取 ceil(remaining_needed / 5) 个帖子
-                    if max_first_level_comments and posts_with_comments:
-                        current_first_level_count = sum(len(p.get('comments_tree', [])) for p in results)
-                        remaining_needed = max_first_level_comments - current_first_level_count
-                        # 保守估计：假设每个帖子平均有3-5个一级评论
-                        estimated_posts_needed = min(len(posts_with_comments), max(1, (remaining_needed + 4) // 3))
-                        posts_to_fetch = posts_with_comments[:estimated_posts_needed]
-                        if len(posts_to_fetch) < len(posts_with_comments):
-                            print(f"  - 目标一级评论数: {max_first_level_comments}，当前: {current_first_level_count}，还需: {remaining_needed}")
-                            print(f"  - 本页有 {len(posts_with_comments)} 个有评论的帖子，先获取前 {len(posts_to_fetch)} 个帖子的评论")
+                    if max_first_level_comments:
+                        # 按页面顺序逐个取回结果并精确控制一级评论数；请求按需提交：
+                        # 同时在途的请求不超过线程数，且已提交未取回帖子的评论数（一级评论数的上限）
+                        # 已够补足剩余目标时不再提交，避免达到目标后仍有已开始的请求白白消耗限流配额
+                        fetch_total = sum(1 for post in posts_to_process if post.comments > 0)
+                        if fetch_total:
+                            print(f"  - 使用 {comment_workers} 个线程并行获取 {fetch_total} 个帖子的评论（目标一级评论数: {max_first_level_comments}，当前: {first_level_count}）...")
+                        
+                        pending = deque()  # 按页面顺序排列的(帖子, future)，没有评论的帖子future为None
+                        pending_posts = iter(posts_to_process)
+                        in_flight = 0  # pending中已提交的请求数
+                        in_flight_comments = 0  # pending中已提交帖子的评论数之和
+                        
+                        def submit_more():
+                            nonlocal in_flight, in_flight_comments
+                            while (in_flight < comment_workers
+                                   and first_level_count + in_flight_comments < max_first_level_comments):
+                                post = next(pending_posts, None)
+                                if post is None:
+                                    return
+                                future = None
+                                if post.comments > 0:
+                                    future = comment_executor.submit(self._fetch_post_comments_worker, post, post.permalink)
+                                    in_flight += 1
+                                    in_flight_comments += post.comments
+                                pending.append((post, future))
+                        
+                        posts_to_add = []
+                        completed_count = 0
+                        try:
+                            submit_more()
+                            while pending:
+                                post, future = pending.popleft()
+                                if future is None:
+                                    post.comments_tree = []
+                                else:
+                                    in_flight -= 1
+                                    in_flight_comments -= post.comments
+                                    try:
+                                        post.comments_tree = future.result()
+                                        completed_count += 1
+                                        self._log(f"    [{completed_count}/{fetch_total}] 完成: {post.title[:50]}...")
+                                    except Exception as e:
+                                        post.comments_tree = []
+                                        self._log(f"    - 获取评论失败: {post.title[:50]}... - {e}")
+                                
+                                # 如果加上这个帖子会超过限制，只保留前remaining个一级评论
+                                remaining = max_first_level_comments - first_level_count
+                                if len(post.comments_tree) > remaining:
+                                    post.comments_tree = post.comments_tree[:remaining]
+                                posts_to_add.append(post)
+                                first_level_count += len(post.comments_tree)
+                                
+                                if first_level_count >= max_first_level_comments:
+                                    break
+                                submit_more()
+                        finally:
+                            # 达到目标（或出错）后，排队中的请求不再需要
+                            for _, future in pending:
+                                if future is not None:
+                                    future.cancel()
+                        
+                        results.extend(posts_to_add)
+                        print(f"  - 已添加 {len(posts_to_add)} 个帖子到结果，当前一级评论数: {first_level_count}")
+                        if first_level_count >= max_first_level_comments:
+                            print(f"  - 已达到目标一级评论数 {max_first_level_comments}，停止添加")
+                            break
                     else:
-                        posts_to_fetch = posts_with_comments
-                    
-                    # 多线程获取评论
-                    if posts_to_fetch:
-                        print(f"  - 使用 {num_threads} 个线程并行获取 {len(posts_to_fetch)} 个帖子的评论...")
+                        # 一次遍历区分有无评论的帖子，没有评论的帖子直接设置空评论树
+                        # （_format_post_to_standard保证每个帖子都有comments字段）
+                        posts_with_comments = []
+                        for post in posts_to_process:
+                            if post.comments > 0:
+                                posts_with_comments.append(post)
+                            else:
+                                post.comments_tree = []
                         
-                        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                        # 多线程获取评论
+                        if posts_with_comments:
+                            print(f"  - 使用 {comment_workers} 个线程并行获取 {len(posts_with_comments)} 个帖子的评论...")
+                            
                             future_to_post = {
-                                executor.submit(self._fetch_post_comments_worker, post, post.get('_permalink', post.get('source_url', ''))): post
-                                for post in posts_to_fetch
-                                if post.get('_permalink') or post.get('source_url')
+                                comment_executor.submit(self._fetch_post_comments_worker, post, post.permalink): post
+                                for post in posts_with_comments
+                                if post.permalink or post.source_url
                             }
                             
                             completed_count = 0
@@ -986,128 +1358,32 @@ class RedditHTMLCrawler:
                                 post = future_to_post[future]
                                 try:
                                     comments = future.result()
-                                    post['comments_tree'] = comments
+                                    post.comments_tree = comments
                                     completed_count += 1
-                                    with self.print_lock:
-                                        print(f"    [{completed_count}/{len(posts_to_fetch)}] 完成: {post['title'][:50]}...")
+                                    self._log(f"    [{completed_count}/{len(posts_with_comments)}] 完成: {post.title[:50]}...")
                                 except Exception as e:
-                                    post['comments_tree'] = []
-                                    with self.print_lock:
-                                        print(f"    - 获取评论失败: {post['title'][:50]}... - {e}")
-                        
-                        # 如果获取的评论还不够，继续获取剩余的帖子
-                        if max_first_level_comments:
-                            # 计算当前已获取的一级评论数（包括results和已获取评论的posts_to_fetch）
-                            current_first_level_count = sum(len(p.get('comments_tree', [])) for p in results)
-                            current_first_level_count += sum(len(p.get('comments_tree', [])) for p in posts_to_fetch)
-                            remaining_needed = max_first_level_comments - current_first_level_count
-                            
-                            if remaining_needed > 0 and len(posts_to_fetch) < len(posts_with_comments):
-                                remaining_posts = posts_with_comments[len(posts_to_fetch):]
-                                # 继续获取剩余帖子，但分批获取
-                                batch_size = min(10, len(remaining_posts), (remaining_needed + 4) // 3)
-                                for batch_start in range(0, len(remaining_posts), batch_size):
-                                    # 重新计算当前已获取的评论数
-                                    current_first_level_count = sum(len(p.get('comments_tree', [])) for p in results)
-                                    current_first_level_count += sum(len(p.get('comments_tree', [])) for p in posts_to_fetch)
-                                    current_first_level_count += sum(len(p.get('comments_tree', [])) for p in remaining_posts[:batch_start])
-                                    remaining_needed = max_first_level_comments - current_first_level_count
-                                    
-                                    if remaining_needed <= 0:
-                                        break
-                                    
-                                    batch = remaining_posts[batch_start:batch_start + batch_size]
-                                    print(f"  - 继续获取 {len(batch)} 个帖子的评论（还需 {remaining_needed} 个一级评论）...")
-                                    
-                                    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-                                        future_to_post = {
-                                            executor.submit(self._fetch_post_comments_worker, post, post.get('_permalink', post.get('source_url', ''))): post
-                                            for post in batch
-                                            if post.get('_permalink') or post.get('source_url')
-                                        }
-                                        
-                                        for future in as_completed(future_to_post):
-                                            post = future_to_post[future]
-                                            try:
-                                                comments = future.result()
-                                                post['comments_tree'] = comments
-                                            except Exception as e:
-                                                post['comments_tree'] = []
-                                    
-                                    # 检查是否达到目标（包括刚获取的batch）
-                                    current_first_level_count = sum(len(p.get('comments_tree', [])) for p in results)
-                                    current_first_level_count += sum(len(p.get('comments_tree', [])) for p in posts_to_fetch)
-                                    current_first_level_count += sum(len(p.get('comments_tree', [])) for p in batch)
-                                    remaining_needed = max_first_level_comments - current_first_level_count
-                                    if remaining_needed <= 0:
-                                        print(f"  - 已达到目标一级评论数 {max_first_level_comments}，停止获取更多评论")
-                                        break
-                    
-                    # 按索引排序并添加到结果
-                    posts_to_process.sort(key=lambda x: x.get('_index', 0))
-                    
-                    # 如果有一级评论数限制，精确控制
-                    if max_first_level_comments:
-                        # 逐个添加帖子，直到达到目标一级评论数
-                        posts_to_add = []
-                        current_count = sum(len(p.get('comments_tree', [])) for p in results)
+                                    post.comments_tree = []
+                                    self._log(f"    - 获取评论失败: {post.title[:50]}... - {e}")
                         
-                        for post in posts_to_process:
-                            first_level_count = len(post.get('comments_tree', []))
-                            
-                            # 如果加上这个帖子会超过限制
-                            if current_count + first_level_count > max_first_level_comments:
-                                # 检查是否还有剩余空间
-                                remaining = max_first_level_comments - current_count
-                                if remaining > 0:
-                                    # 只保留前remaining个一级评论
-                                    truncated_post = post.copy()
-                                    truncated_post['comments_tree'] = post.get('comments_tree', [])[:remaining]
-                                    posts_to_add.append(truncated_post)
-                                    current_count += remaining
-                                # 无论是否截断，都停止添加（因为已经达到或超过限制）
+                        # 评论结果直接写回posts_to_process中的帖子，列表保持页面顺序，无需重新排序
+                        if max_posts:
+                            # 兼容性处理：使用旧的max_posts逻辑
+                            remaining_slots = max_posts - len(results)
+                            if remaining_slots <= 0:
+                                print(f"  - 已达到最大爬取数量 {max_posts}，跳过本页剩余帖子")
                                 break
-                            else:
-                                # 可以完整添加这个帖子
-                                posts_to_add.append(post)
-                                current_count += first_level_count
-                        
-                        # 添加帖子到results
-                        if posts_to_add:
+                            posts_to_add = posts_to_process[:remaining_slots]
                             results.extend(posts_to_add)
-                            final_count = sum(len(p.get('comments_tree', [])) for p in results)
-                            print(f"  - 已添加 {len(posts_to_add)} 个帖子到结果，当前一级评论数: {final_count}")
-                            
-                            if final_count >= max_first_level_comments:
-                                print(f"  - 已达到目标一级评论数 {max_first_level_comments}，停止添加")
-                                break
+                            first_level_count += sum(len(p.comments_tree) for p in posts_to_add)
+                            if len(posts_to_process) > remaining_slots:
+                                print(f"  - 本页有 {len(posts_to_process)} 个帖子，但只能添加 {remaining_slots} 个（已达到限制 {max_posts}）")
                         else:
-                            # 如果没有帖子可以添加，说明已经达到限制
-                            current_count = sum(len(p.get('comments_tree', [])) for p in results)
-                            if current_count >= max_first_level_comments:
-                                print(f"  - 已达到目标一级评论数 {max_first_level_comments}，跳过本页剩余帖子")
-                                break
-                    elif max_posts:
-                        # 兼容性处理：使用旧的max_posts逻辑
-                        remaining_slots = max_posts - len(results)
-                        if remaining_slots <= 0:
-                            print(f"  - 已达到最大爬取数量 {max_posts}，跳过本页剩余帖子")
-                            break
-                        posts_to_add = posts_to_process[:remaining_slots]
-                        results.extend(posts_to_add)
-                        if len(posts_to_process) > remaining_slots:
-                            print(f"  - 本页有 {len(posts_to_process)} 个帖子，但只能添加 {remaining_slots} 个（已达到限制 {max_posts}）")
-                    else:
-                        results.extend(posts_to_process)
-                    
-                    # 清理临时字段
-                    for post in posts_to_process:
-                        post.pop('_index', None)
-                        post.pop('_permalink', None)
+                            results.extend(posts_to_process)
+                            first_level_count += sum(len(p.comments_tree) for p in posts_to_process)
                 else:
                     # 不需要获取评论，直接添加
                     for post in posts_to_process:
-                        post['comments_tree'] = []
+                        post.comments_tree = []
                     
                     # 如果有限制，确保不超过限制
                     if max_posts:
@@ -1123,10 +1399,9 @@ class RedditHTMLCrawler:
                     else:
                         results.extend(posts_to_process)
                 
-                # 检查是否达到一级评论数限制
-                current_first_level_count = sum(len(p.get('comments_tree', [])) for p in results)
-                if max_first_level_comments and current_first_level_count >= max_first_level_comments:
-                    print(f"  - 已达到目标一级评论数 {max_first_level_comments}（当前: {current_first_level_count}），停止翻页")
+                # 检查是否达到一级评论数限制（不获取评论时新增帖子的评论树为空，总数不变）
+                if max_first_level_comments and first_level_count >= max_first_level_comments:
+                    print(f"  - 已达到目标一级评论数 {max_first_level_comments}（当前: {first_level_count}），停止翻页")
                     break
                 
                 # 兼容性检查：如果使用旧的max_posts参数
@@ -1137,24 +1412,12 @@ class RedditHTMLCrawler:
                 if not after_token:
                     print("  - 没有更多页面，停止翻页")
                     break
-                
-                # 延迟避免请求过快
-                time.sleep(self.delay)
             
             if not results:
                 print(f"  - 未找到匹配的帖子（关键词: {keywords}）")
             else:
                 # 计算总评论数（使用comments_tree）
-                def count_comments(comments_tree):
-                    if not comments_tree:
-                        return 0
-                    count = len(comments_tree)
-                    for comment in comments_tree:
-                        if isinstance(comment, dict) and 'replies' in comment:
-                            count += count_comments(comment.get('replies', []))
-                    return count
-                
-                total_comments = sum(count_comments(p.get('comments_tree', [])) for p in results)
+                total_comments = sum(_count_comments(p.comments_tree) for p in results)
                 print(f"\n  - 爬取完成: 共找到 {len(results)} 个匹配的帖子，共 {total_comments} 条评论")
                 print(f"  - 共爬取了 {page_num} 页，处理了 {total_crawled} 个帖子")
         
@@ -1162,10 +1425,16 @@ class RedditHTMLCrawler:
             print(f"  - 爬取失败: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            # 停止翻页时不再等待已提前发出的下一页请求
+            if page_executor is not None:
+                page_executor.shutdown(wait=False, cancel_futures=True)
+            if comment_executor is not None:
+                comment_executor.shutdown(wait=False, cancel_futures=True)
         
         return results
     
-    def crawl_batch(self, query_seeds: List[str], filter_keywords: List[str] = None, max_first_level_comments: int = None, num_threads: int = 16) -> List[Dict[str, Any]]:
+    def crawl_batch(self, query_seeds: List[str], filter_keywords: List[str] = None, max_first_level_comments: int = None, num_threads: int = 16) -> List[Post]:
         """
         批量爬取多个搜索关键词（并行版本）
         
@@ -1173,13 +1442,15 @@ class RedditHTMLCrawler:
             query_seeds: 搜索关键词列表
             filter_keywords: 标题过滤关键词列表（用于二次过滤）
             max_first_level_comments: 总最大一级评论数量（None表示不限制，会平均分配给每个关键词）
-            num_threads: 并发线程数（默认16，用于并行获取评论）
+            num_threads: 并发线程数上限（默认16，用于并行获取评论；实际不超过最大并发请求数），同时也是并行爬取的关键词数上限
             
         Returns:
             所有帖子数据列表
         """
         all_results = []
         seen_post_ids = set()
+        # all_results中的一级评论总数（随收集累加）
+        total_first_level = 0
         
         # 提前计算每个关键词的一级评论配额（完全均分）
         query_quotas = {}
@@ -1204,13 +1475,13 @@ class RedditHTMLCrawler:
                 query_quotas[query] = None
         
         # 定义单个关键词的爬取函数
-        def crawl_single_query(query: str, query_index: int) -> List[Dict[str, Any]]:
+        def crawl_single_query(query: str, query_index: int) -> List[Post]:
             """爬取单个关键词的帖子，直到达到一级评论配额"""
             try:
                 print(f"\n[{query_index}/{len(query_seeds)}] 处理搜索关键词: {query}")
                 
                 # 构建搜索URL
-                search_url = self._build_search_url(query)
+                search_url = _build_search_url(query)
                 print(f"  - 搜索URL: {search_url}")
                 
                 # 获取该关键词的一级评论配额
@@ -1229,17 +1500,16 @@ class RedditHTMLCrawler:
                 )
                 
                 # 统计实际爬取的一级评论数
-                total_first_level = sum(len(post.get('comments_tree', [])) for post in results)
+                total_first_level = sum(len(post.comments_tree) for post in results)
                 print(f"  - [{query_index}/{len(query_seeds)}] {query} 完成: 爬取了 {len(results)} 个帖子，共 {total_first_level} 个一级评论")
                 return results
             except Exception as e:
-                with self.print_lock:
-                    print(f"  - [{query_index}/{len(query_seeds)}] {query} 爬取失败: {e}")
+                self._log(f"  - [{query_index}/{len(query_seeds)}] {query} 爬取失败: {e}")
                 return []
         
-        # 串行爬取所有关键词（避免并发访问新URL触发限流）
-        # 如果关键词数量较少（<=3），可以并行；否则串行
-        max_parallel_queries = min(3, len(query_seeds))
+        # 所有关键词共享同一个Session连接池，请求频率由全局令牌桶和信号量按请求控制，
+        # 因此不再额外限制并行关键词数，只受num_threads约束
+        max_parallel_queries = max(1, min(num_threads, len(query_seeds)))
         print(f"\n开始爬取 {len(query_seeds)} 个关键词（最多 {max_parallel_queries} 个并行）...")
         with ThreadPoolExecutor(max_workers=max_parallel_queries) as executor:
             # 提交所有任务
@@ -1255,35 +1525,31 @@ class RedditHTMLCrawler:
                     results = future.result()
                     for post in results:
                         # 去重（使用source_platform_id）
-                        post_id = post.get('source_platform_id', post.get('id', ''))
+                        post_id = post.source_platform_id
                         if post_id and post_id not in seen_post_ids:
                             seen_post_ids.add(post_id)
                             all_results.append(post)
-                    
-                    # 统计当前总一级评论数
-                    current_total_first_level = sum(len(post.get('comments_tree', [])) for post in all_results)
+                            total_first_level += len(post.comments_tree)
                     
                     # 检查是否达到总一级评论数限制
-                    if max_first_level_comments and current_total_first_level >= max_first_level_comments:
-                        print(f"\n已达到总一级评论数限制 {max_first_level_comments}，当前共 {current_total_first_level} 个，停止收集结果")
+                    if max_first_level_comments and total_first_level >= max_first_level_comments:
+                        print(f"\n已达到总一级评论数限制 {max_first_level_comments}，当前共 {total_first_level} 个，停止收集结果")
                         # 取消其他未完成的任务
                         for f in future_to_query:
                             if not f.done():
                                 f.cancel()
                         break
                 except Exception as e:
-                    with self.print_lock:
-                        print(f"  - 处理 {query} 的结果时出错: {e}")
+                    self._log(f"  - 处理 {query} 的结果时出错: {e}")
         
         # 如果超过限制，精确截断到目标一级评论数
         if max_first_level_comments:
-            total_first_level = sum(len(post.get('comments_tree', [])) for post in all_results)
             if total_first_level > max_first_level_comments:
                 # 需要精确截断：保留帖子直到达到目标一级评论数
                 truncated_results = []
                 current_count = 0
                 for post in all_results:
-                    first_level_count = len(post.get('comments_tree', []))
+                    first_level_count = len(post.comments_tree)
                     if current_count + first_level_count <= max_first_level_comments:
                         truncated_results.append(post)
                         current_count += first_level_count
@@ -1292,13 +1558,13 @@ class RedditHTMLCrawler:
                         remaining_needed = max_first_level_comments - current_count
                         if remaining_needed > 0:
                             # 只保留前remaining_needed个一级评论
-                            truncated_post = post.copy()
-                            truncated_post['comments_tree'] = post.get('comments_tree', [])[:remaining_needed]
-                            truncated_results.append(truncated_post)
+                            # 帖子只属于本次批量结果，直接原地截断，无需复制
+                            post.comments_tree = post.comments_tree[:remaining_needed]
+                            truncated_results.append(post)
+                            current_count += remaining_needed
                         break
                 all_results = truncated_results
-                final_count = sum(len(post.get('comments_tree', [])) for post in all_results)
-                print(f"\n精确截断完成: 从 {total_first_level} 个一级评论截断到 {final_count} 个（目标: {max_first_level_comments}）")
+                print(f"\n精确截断完成: 从 {total_first_level} 个一级评论截断到 {current_count} 个（目标: {max_first_level_comments}）")
         
         return all_results
     
@@ -1370,101 +1636,116 @@ class RedditHTMLCrawler:
         filepath = os.path.join(self.raw_dir, filename)
         return os.path.exists(filepath)
     
-    def save_to_json(self, data: List[Dict[str, Any]], task_id: str):
+    def _iter_comment_items(self, data: List[Post]) -> Iterator[Dict[str, Any]]:
         """
-        将数据保存为JSON文件到Data/raw/目录
-        注意：不是保存整个Post，而是将每个第一层评论提取出来作为独立的项目
+        逐个生成要保存的评论项目：每个第一层评论作为一个独立项目
         
         Args:
-            data: 要保存的数据（Post列表）
-            task_id: 任务ID（必需）
+            data: Post列表
+            
+        Yields:
+            以第一层评论为主体的项目
         """
-        if not task_id:
-            raise ValueError("任务ID不能为空")
-        
-        # 检查任务ID是否已存在
-        if self.check_task_id_exists(task_id):
-            raise ValueError(f"任务ID '{task_id}' 已存在，不允许使用同名ID")
-        
-        # 提取每个Post的第一层评论作为独立项目
-        formatted_data = []
         item_counter = 0
+        calculate_hash = self._calculate_content_hash
         
         for post in data:
-            # 确保comments_tree字段存在
-            comments_tree = post.get('comments_tree', [])
+            comments_tree = post.comments_tree
             
             if not comments_tree:
                 # 如果没有评论，跳过该Post（因为现在只保存评论作为项目）
                 continue
             
+            # Post相关信息每个Post只构建一次，该Post的所有项目共用同一个字典（序列化时只读）
+            post_info = {
+                "post_id": post.source_platform_id,
+                "post_title": post.title,
+                "post_author": post.author_name,
+                "post_likes": post.likes,
+                "post_comments_count": post.comments
+            }
+            # 该Post所有项目共用的字段，每个Post只读取一次
+            platform = post.platform
+            source_url = post.source_url
+            fetched_at = post.fetched_at
+            title = post.title
+            lang = post.lang
+            media_urls = post.media_urls
+            query_seed = post.query_seed
+            
             # 为每个第一层评论创建一个独立的项目
             for first_level_comment in comments_tree:
                 item_counter += 1
                 
                 # 构建新项目，以第一层评论为主体
-                comment_item = {
+                yield {
                     "post_id": item_counter,  # 自增ID
-                    "platform": post.get('platform', 'reddit'),
-                    "source_url": post.get('source_url', ''),  # Post的URL
-                    "source_platform_id": first_level_comment.get('id', ''),  # 第一层评论的ID
-                    "hash_content": self._calculate_content_hash(first_level_comment.get('body', '')),
-                    "fetched_at": post.get('fetched_at', datetime.now().isoformat()),
-                    "title": post.get('title', ''),  # Post的标题
-                    "content_text": first_level_comment.get('body', ''),  # 第一层评论的内容
-                    "lang": post.get('lang', 'english'),
-                    "media_urls": post.get('media_urls', []),
-                    "author_name": first_level_comment.get('author', '[deleted]'),  # 第一层评论的作者
-                    "author_handle": first_level_comment.get('author', '[deleted]'),
+                    "platform": platform,
+                    "source_url": source_url,  # Post的URL
+                    "source_platform_id": first_level_comment.id,  # 第一层评论的ID
+                    "hash_content": calculate_hash(first_level_comment.body),
+                    "fetched_at": fetched_at,
+                    "title": title,  # Post的标题
+                    "content_text": first_level_comment.body,  # 第一层评论的内容
+                    "lang": lang,
+                    "media_urls": media_urls,
+                    "author_name": first_level_comment.author,  # 第一层评论的作者
+                    "author_handle": first_level_comment.author,
                     "author_followers": None,  # Reddit没有粉丝量
-                    "author_profile": first_level_comment.get('author_profile', None),  # 第一层评论的author个人主页URL
-                    "likes": first_level_comment.get('score', 0),  # 第一层评论的upvote数
-                    "comments": self._count_comments_in_tree([first_level_comment]),  # 该评论及其子评论的总数
+                    "author_profile": first_level_comment.author_profile,  # 第一层评论的author个人主页URL
+                    "likes": first_level_comment.score,  # 第一层评论的upvote数
+                    "comments": 1 + _count_comments(first_level_comment.replies),  # 该评论及其子评论的总数
                     "saves": None,
                     "views": None,
                     # Post相关信息（保留用于上下文）
-                    "post_info": {
-                        "post_id": post.get('source_platform_id', ''),
-                        "post_title": post.get('title', ''),
-                        "post_author": post.get('author_name', ''),
-                        "post_likes": post.get('likes', 0),
-                        "post_comments_count": post.get('comments', 0)
-                    },
+                    "post_info": post_info,
                     # 记录query_seed
-                    "query_seed": post.get('_query_seed', None),
+                    "query_seed": query_seed,
                     # 评论树（包含该第一层评论及其所有子评论）
                     "comments_tree": [first_level_comment]  # 只包含这一个第一层评论及其子评论
                 }
-                
-                formatted_data.append(comment_item)
-        
-        filename = f"{task_id}.json"
-        filepath = os.path.join(self.raw_dir, filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(formatted_data, f, ensure_ascii=False, indent=2)
-        
-        print(f"\n数据已保存到: {filepath}")
-        print(f"共保存 {len(formatted_data)} 个评论项目（来自 {len(data)} 个帖子）")
     
-    def _count_comments_in_tree(self, comments_tree: List[Dict[str, Any]]) -> int:
+    def save_to_json(self, data: List[Post], task_id: str) -> Tuple[int, int]:
         """
-        递归计算评论树中的评论总数（包括所有层级的子评论）
+        将数据保存为JSON文件到Data/raw/目录
+        注意：不是保存整个Post，而是将每个第一层评论提取出来作为独立的项目
         
         Args:
-            comments_tree: 评论树列表
+            data: 要保存的数据（Post列表）
+            task_id: 任务ID（必需）
             
         Returns:
-            评论总数
+            (第一层评论数, 总评论数（包括子评论）)，构建项目时顺带统计，调用方无需再遍历评论树
         """
-        if not comments_tree:
-            return 0
-        count = len(comments_tree)
-        for comment in comments_tree:
-            replies = comment.get('replies', [])
-            if replies:
-                count += self._count_comments_in_tree(replies)
-        return count
+        if not task_id:
+            raise ValueError("任务ID不能为空")
+        
+        # 检查任务ID是否已存在
+        if self.check_task_id_exists(task_id):
+            raise ValueError(f"任务ID '{task_id}' 已存在，不允许使用同名ID")
+        
+        filename = f"{task_id}.json"
+        filepath = os.path.join(self.raw_dir, filename)
+        
+        item_count = 0
+        # 各第一层评论的子树互不重叠，累加每个项目的comments即为总评论数
+        total_comments = 0
+        
+        # 逐个项目编码写出，不在内存中构建完整的项目列表；
+        # 项目使用紧凑格式（不缩进），每个项目占一行，仍是标准的JSON数组
+        with open(filepath, 'wb', buffering=_WRITE_BUFFER_SIZE) as f:
+            f.write(b'[')
+            for item in self._iter_comment_items(data):
+                f.write(b',\n' if item_count else b'\n')
+                f.write(_dumps_item(item))
+                item_count += 1
+                total_comments += item["comments"]
+            f.write(b'\n]' if item_count else b']')
+        
+        print(f"\n数据已保存到: {filepath}")
+        print(f"共保存 {item_count} 个评论项目（来自 {len(data)} 个帖子）")
+        
+        return item_count, total_comments
     
 
 
@@ -1521,26 +1802,19 @@ def main():
     print(f"并发线程数: {args.threads}")
     
     # 批量爬取
-    data = crawler.crawl_batch(query_seeds, filter_keywords, max_posts=args.max_posts, num_threads=args.threads)
+    try:
+        data = crawler.crawl_batch(query_seeds, filter_keywords, max_posts=args.max_posts, num_threads=args.threads)
+    finally:
+        # 爬取结束（包括出错时），保存数据不再访问Reddit，释放连接池
+        RedditHTMLCrawler.close_shared_session()
     
     # 保存数据
     if data:
         try:
-            crawler.save_to_json(data, args.task_id)
+            # 统计信息由save_to_json构建项目时一并得到（注意：save_to_json已经打印了保存后的统计信息）
+            first_level_comments, total_comments = crawler.save_to_json(data, args.task_id)
             
-            # 统计信息（注意：save_to_json已经打印了保存后的统计信息）
             # 这里只打印原始Post的统计
-            def count_comments(comments_tree):
-                if not comments_tree:
-                    return 0
-                count = len(comments_tree)
-                for comment in comments_tree:
-                    if isinstance(comment, dict) and 'replies' in comment:
-                        count += count_comments(comment.get('replies', []))
-                return count
-            
-            total_comments = sum(count_comments(post.get('comments_tree', [])) for post in data)
-            first_level_comments = sum(len(post.get('comments_tree', [])) for post in data)
             print(f"\n原始数据统计:")
             print(f"  - 帖子数: {len(data)}")
             print(f"  - 第一层评论数: {first_level_comments}")
@@ -5,11 +5,21 @@
 功能：读取并美化打印ready_for_DB文件中的格式化内容树
 """
 
+import io
 import os
+import sys
 import json
 import argparse
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, TextIO
 from parse_content_tree import ContentTreeParser
+from json_loader import load_json_file
+
+
+# 各评论深度对应的缩进，预先生成，打印时直接按深度取用（超出范围时再现算）
+_INDENTS = tuple("  " * depth for depth in range(128))
+
+# 已删除评论的正文占位符，这类正文原样打印一行，不按行拆分
+_DELETED_BODIES = frozenset(('[deleted]', '[removed]'))
 
 
 class ReadyDataViewer:
@@ -20,6 +30,46 @@ class ReadyDataViewer:
         self.data_dir = "Data"
         self.ready_dir = os.path.join(self.data_dir, "ready_for_DB")
         self.parser = ContentTreeParser()
+        # 当前查看任务的解析结果（Post序号 -> 解析结果），跨运行保存在磁盘缓存文件中
+        self._task_parsed: Optional[Dict[str, Any]] = None
+    
+    def _parse_cache_path(self, task_id: str) -> str:
+        """获取任务解析结果缓存文件路径"""
+        return os.path.join(self.ready_dir, f".{task_id}.parsed.json")
+    
+    def _load_parse_cache(self, task_id: str) -> Dict[str, Any]:
+        """
+        加载任务的解析结果缓存（缓存文件比ready文件旧时视为失效）
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            Post序号（字符串）-> 解析结果
+        """
+        cache_path = self._parse_cache_path(task_id)
+        ready_path = os.path.join(self.ready_dir, f"{task_id}_ready.json")
+        try:
+            if os.path.getmtime(cache_path) < os.path.getmtime(ready_path):
+                return {}
+            cache = load_json_file(cache_path)
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+    
+    def _save_parse_cache(self, task_id: str, cache: Dict[str, Any]):
+        """
+        保存任务的解析结果缓存（写入失败只提示，不影响查看）
+        
+        Args:
+            task_id: 任务ID
+            cache: Post序号（字符串）-> 解析结果
+        """
+        try:
+            with open(self._parse_cache_path(task_id), 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, separators=(',', ':'))
+        except OSError as e:
+            print(f"⚠️  保存解析缓存失败: {e}")
     
     def load_ready_data(self, task_id: str) -> List[Dict[str, Any]]:
         """
@@ -37,8 +87,7 @@ class ReadyDataViewer:
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Ready文件不存在: {filepath}")
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_json_file(filepath)
     
     def print_post(self, post: Dict[str, Any], index: int, total: int, show_metadata: bool = True):
         """
@@ -50,58 +99,86 @@ class ReadyDataViewer:
             total: 总数
             show_metadata: 是否显示元数据（scene, post_type, score等）
         """
-        print("\n" + "=" * 100)
-        print(f"Post {index}/{total}")
-        print("=" * 100)
+        # 整个Post的输出先写入内存缓冲区，最后一次性写到stdout（逐行print会产生大量write调用）
+        out = io.StringIO()
+        
+        print("\n" + "=" * 100, file=out)
+        print(f"Post {index}/{total}", file=out)
+        print("=" * 100, file=out)
         
         # 显示元数据
         if show_metadata:
-            print("\n【元数据】")
-            print(f"  平台: {post.get('platform', 'N/A')}")
-            print(f"  来源URL: {post.get('source_url', 'N/A')}")
-            print(f"  平台ID: {post.get('source_platform_id', 'N/A')}")
-            print(f"  场景: {post.get('scene', 'N/A')}")
-            print(f"  类型: {post.get('post_type', 'N/A')}")
-            print(f"  质量分数: {post.get('base_quality_score', 'N/A')}")
-            print(f"  点赞数: {post.get('likes', 0)}")
-            print(f"  评论数: {post.get('comments_count', 0)}")
-            print(f"  语言: {post.get('lang', 'N/A')}")
-            print(f"  抓取时间: {post.get('fetched_at', 'N/A')}")
-            print()
+            print("\n【元数据】", file=out)
+            print(f"  平台: {post.get('platform', 'N/A')}", file=out)
+            print(f"  来源URL: {post.get('source_url', 'N/A')}", file=out)
+            print(f"  平台ID: {post.get('source_platform_id', 'N/A')}", file=out)
+            print(f"  场景: {post.get('scene', 'N/A')}", file=out)
+            print(f"  类型: {post.get('post_type', 'N/A')}", file=out)
+            print(f"  质量分数: {post.get('base_quality_score', 'N/A')}", file=out)
+            print(f"  点赞数: {post.get('likes', 0)}", file=out)
+            print(f"  评论数: {post.get('comments_count', 0)}", file=out)
+            print(f"  语言: {post.get('lang', 'N/A')}", file=out)
+            print(f"  抓取时间: {post.get('fetched_at', 'N/A')}", file=out)
+            print(file=out)
         
         # 解析并打印内容树
         content_text = post.get('content_text', '')
         if content_text:
-            print("【内容树】")
-            print("-" * 100)
+            print("【内容树】", file=out)
+            print("-" * 100, file=out)
             
             # 解析内容树
             try:
-                parsed = self.parser.parse(content_text)
-                self._print_parsed_tree(parsed)
+                parsed = self._parse_content(content_text, index)
+                self._print_parsed_tree(parsed, out)
             except Exception as e:
-                print(f"⚠️  解析失败: {e}")
-                print("\n原始内容（前500字符）:")
-                print(content_text[:500])
+                print(f"⚠️  解析失败: {e}", file=out)
+                print("\n原始内容（前500字符）:", file=out)
+                print(content_text[:500], file=out)
                 if len(content_text) > 500:
-                    print(f"... (共 {len(content_text)} 字符)")
+                    print(f"... (共 {len(content_text)} 字符)", file=out)
         else:
-            print("【内容树】")
-            print("  (无内容)")
+            print("【内容树】", file=out)
+            print("  (无内容)", file=out)
         
-        print("\n" + "=" * 100)
+        print("\n" + "=" * 100, file=out)
+        
+        sys.stdout.write(out.getvalue())
+        sys.stdout.flush()
     
-    def _print_parsed_tree(self, parsed: Dict[str, Any]):
+    def _parse_content(self, content_text: str, index: Optional[int] = None) -> Dict[str, Any]:
+        """
+        解析内容树：优先使用当前任务的解析缓存，每个Post每次运行最多解析一次
+        
+        Args:
+            content_text: 格式化的内容树文本
+            index: Post在任务中的序号（从1开始）
+            
+        Returns:
+            解析后的字典
+        """
+        key = str(index)
+        if self._task_parsed is not None and key in self._task_parsed:
+            return self._task_parsed[key]
+        
+        parsed = self.parser.parse(content_text)
+        
+        if self._task_parsed is not None and index is not None:
+            self._task_parsed[key] = parsed
+        return parsed
+    
+    def _print_parsed_tree(self, parsed: Dict[str, Any], out: TextIO):
         """
         打印解析后的内容树
         
         Args:
             parsed: 解析后的字典
+            out: 输出目标
         """
         # 帖子标题
         title = parsed.get('title')
         if title:
-            print(f"\n📌 标题: {title}")
+            print(f"\n📌 标题: {title}", file=out)
         
         # 发帖者信息
         author = parsed.get('author', {})
@@ -111,48 +188,53 @@ class ReadyDataViewer:
             author_handle = author.get('handle')
             if author_handle and author_handle != author_name:
                 author_info += f" (@{author_handle})"
-            print(author_info)
+            print(author_info, file=out)
         
         # 帖子内容
         content = parsed.get('content')
         if content and content.strip():
-            print(f"\n📝 内容:")
-            print("-" * 80)
-            print(content)
-            print("-" * 80)
+            print(f"\n📝 内容:", file=out)
+            print("-" * 80, file=out)
+            print(content, file=out)
+            print("-" * 80, file=out)
         elif not title:
             # 如果没有标题也没有内容，说明可能是空帖子
-            print("\n📝 内容: (无内容)")
+            print("\n📝 内容: (无内容)", file=out)
         
         # 评论树
         comments = parsed.get('comments', [])
         if comments:
             # 计算总评论数（包括子评论）
             total_comments = self._count_comments(comments)
-            print(f"\n💬 评论 ({len(comments)} 条顶级评论，共 {total_comments} 条):")
-            print("-" * 80)
-            self._print_comments(comments, depth=0)
+            print(f"\n💬 评论 ({len(comments)} 条顶级评论，共 {total_comments} 条):", file=out)
+            print("-" * 80, file=out)
+            self._print_comments(comments, out, depth=0)
         else:
-            print("\n💬 评论: (无评论)")
+            print("\n💬 评论: (无评论)", file=out)
     
     def _count_comments(self, comments: List[Dict[str, Any]]) -> int:
-        """递归计算评论总数（包括子评论）"""
-        count = len(comments)
-        for comment in comments:
-            replies = comment.get('replies', [])
-            if replies:
-                count += self._count_comments(replies)
+        """计算评论总数（包括子评论，使用显式栈迭代，深层回复不会触发递归深度限制）"""
+        count = 0
+        stack = [comments]
+        while stack:
+            level = stack.pop()
+            count += len(level)
+            for comment in level:
+                replies = comment.get('replies', [])
+                if replies:
+                    stack.append(replies)
         return count
     
-    def _print_comments(self, comments: List[Dict[str, Any]], depth: int = 0):
+    def _print_comments(self, comments: List[Dict[str, Any]], out: TextIO, depth: int = 0):
         """
         递归打印评论树
         
         Args:
             comments: 评论列表
+            out: 输出目标
             depth: 当前深度
         """
-        indent = "  " * depth
+        indent = _INDENTS[depth] if depth < len(_INDENTS) else "  " * depth
         
         for i, comment in enumerate(comments):
             # 评论头部
@@ -167,35 +249,35 @@ class ReadyDataViewer:
             submitter_mark = " [发帖者]" if is_submitter else ""
             
             # 打印评论
-            print(f"\n{indent}┌─ 评论 #{i+1}")
+            print(f"\n{indent}┌─ 评论 #{i+1}", file=out)
             if comment_id:
-                print(f"{indent}│  ID: {comment_id}")
-            print(f"{indent}│  作者: {author_id}{submitter_mark}")
+                print(f"{indent}│  ID: {comment_id}", file=out)
+            print(f"{indent}│  作者: {author_id}{submitter_mark}", file=out)
             if score:
-                print(f"{indent}│  点赞: {score}")
+                print(f"{indent}│  点赞: {score}", file=out)
             if created_utc:
-                print(f"{indent}│  时间: {created_utc}")
-            print(f"{indent}│  内容:")
+                print(f"{indent}│  时间: {created_utc}", file=out)
+            print(f"{indent}│  内容:", file=out)
             
             # 打印评论内容（多行处理）
-            if body and body not in ['[deleted]', '[removed]']:
+            if body and body not in _DELETED_BODIES:
                 body_lines = body.split('\n')
                 for line in body_lines:
                     if line.strip():  # 跳过空行
-                        print(f"{indent}│    {line}")
+                        print(f"{indent}│    {line}", file=out)
                     else:
-                        print(f"{indent}│")
+                        print(f"{indent}│", file=out)
             else:
-                print(f"{indent}│    {body}")
+                print(f"{indent}│    {body}", file=out)
             
             # 打印子评论
             replies = comment.get('replies', [])
             if replies:
-                print(f"{indent}│")
-                print(f"{indent}│  └─ 回复 ({len(replies)} 条):")
-                self._print_comments(replies, depth + 1)
+                print(f"{indent}│", file=out)
+                print(f"{indent}│  └─ 回复 ({len(replies)} 条):", file=out)
+                self._print_comments(replies, out, depth + 1)
             
-            print(f"{indent}└─")
+            print(f"{indent}└─", file=out)
     
     def view_task(self, task_id: str, post_index: Optional[int] = None, show_metadata: bool = True):
         """
@@ -221,27 +303,36 @@ class ReadyDataViewer:
             print("数据为空")
             return
         
-        # 如果指定了post_index，只显示该Post
-        if post_index is not None:
-            if post_index < 1 or post_index > len(ready_data):
-                print(f"错误: Post索引 {post_index} 超出范围（共 {len(ready_data)} 条）")
-                return
-            self.print_post(ready_data[post_index - 1], post_index, len(ready_data), show_metadata)
-        else:
-            # 显示所有Post
-            for i, post in enumerate(ready_data, 1):
-                self.print_post(post, i, len(ready_data), show_metadata)
-                
-                # 如果不是最后一个，询问是否继续
-                if i < len(ready_data):
-                    try:
-                        user_input = input(f"\n按Enter继续查看下一个Post ({i+1}/{len(ready_data)})，输入q退出: ")
-                        if user_input.lower() == 'q':
-                            print("\n已退出")
+        # 加载该任务之前保存的解析结果，查看结束后连同新解析的结果一起写回
+        self._task_parsed = self._load_parse_cache(task_id)
+        cached_count = len(self._task_parsed)
+        
+        try:
+            # 如果指定了post_index，只显示该Post
+            if post_index is not None:
+                if post_index < 1 or post_index > len(ready_data):
+                    print(f"错误: Post索引 {post_index} 超出范围（共 {len(ready_data)} 条）")
+                    return
+                self.print_post(ready_data[post_index - 1], post_index, len(ready_data), show_metadata)
+            else:
+                # 显示所有Post
+                for i, post in enumerate(ready_data, 1):
+                    self.print_post(post, i, len(ready_data), show_metadata)
+                    
+                    # 如果不是最后一个，询问是否继续
+                    if i < len(ready_data):
+                        try:
+                            user_input = input(f"\n按Enter继续查看下一个Post ({i+1}/{len(ready_data)})，输入q退出: ")
+                            if user_input.lower() == 'q':
+                                print("\n已退出")
+                                break
+                        except KeyboardInterrupt:
+                            print("\n\n已中断")
                             break
-                    except KeyboardInterrupt:
-                        print("\n\n已中断")
-                        break
+        finally:
+            if len(self._task_parsed) > cached_count:
+                self._save_parse_cache(task_id, self._task_parsed)
+            self._task_parsed = None
 
 
 def main():